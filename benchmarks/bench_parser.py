@@ -0,0 +1,110 @@
+"""Parser throughput benchmark.
+
+Generates reproducible 10k/100k/1M-line inputs (valid, malformed, mixed) under
+benchmarks/data/ and times the fast path, the batch entry point and the loose
+fallback parser on each.
+
+    python -m benchmarks.bench_parser                  # all sizes
+    python -m benchmarks.bench_parser --sizes 10000    # quick run
+    python -m benchmarks.bench_parser --json results.jsonl  # append results
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.parser import parse_line, parse_lines, _parse_line_loose, build_output_line
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+SIZES = [10_000, 100_000, 1_000_000]
+KINDS = ["valid", "malformed", "mixed"]
+RANKS = ["Warrior", "Elite", "Master", "Grandmaster", "Epic", "Legend", "Mythic", "Mythical Glory"]
+COUNTRIES = ["PH", "ID", "MY", "SG", "US", "BR", "RU", "MM"]
+
+def random_account(rng):
+    n = rng.randrange(10 ** 9)
+    return {
+        "email": f"user{n}@mail.com",
+        "password": f"pw{rng.randrange(10 ** 6)}",
+        "uid": str(n),
+        "server_id": str(rng.randrange(1000, 20000)),
+        "name": f"Player{rng.randrange(10 ** 5)}",
+        "rank": rng.choice(RANKS),
+        "level": rng.randrange(1, 160),
+        "country": rng.choice(COUNTRIES),
+        "banned": rng.random() < 0.1,
+        "credits": "Config by RZX",
+    }
+
+def malformed_line(rng):
+    acc = random_account(rng)
+    variant = rng.randrange(4)
+    if variant == 0:
+        return f"{acc['email']},{acc['password']},{acc['uid']},{acc['level']}"
+    if variant == 1:
+        return build_output_line(acc).replace(" | ", " || ", 2)
+    if variant == 2:
+        return build_output_line(acc).replace(f"level = {acc['level']}", "level = ??")
+    return "".join(rng.choice("abc:|=() 123") for _ in range(rng.randrange(5, 80)))
+
+def generate(path, size, kind, seed=1234):
+    rng = random.Random(f"{seed}-{size}-{kind}")
+    with open(path, "w", encoding="utf-8") as f:
+        for _ in range(size):
+            bad = kind == "malformed" or (kind == "mixed" and rng.random() < 0.2)
+            f.write((malformed_line(rng) if bad else build_output_line(random_account(rng))) + "\n")
+
+def dataset(size, kind):
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.join(DATA_DIR, f"{kind}_{size}.txt")
+    if not os.path.exists(path):
+        generate(path, size, kind)
+    return path
+
+def bench(fn, lines, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(lines)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+PARSERS = {
+    "parse_line": lambda lines: [parse_line(l) for l in lines],
+    "parse_lines": parse_lines,
+    "loose": lambda lines: [_parse_line_loose(l) for l in lines],
+}
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    ap.add_argument("--kinds", nargs="+", choices=KINDS, default=KINDS)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--json", help="append one JSON record per result to this file")
+    args = ap.parse_args()
+
+    stamp = datetime.now().isoformat(timespec="seconds")
+    print(f"{'dataset':<18}{'parser':<13}{'seconds':>10}{'lines/s':>14}{'parsed':>10}")
+    for size in args.sizes:
+        for kind in args.kinds:
+            with open(dataset(size, kind), encoding="utf-8") as f:
+                lines = f.read().splitlines()
+            for name, fn in PARSERS.items():
+                secs = bench(fn, lines, args.repeat)
+                parsed = sum(1 for a in fn(lines) if a)
+                print(f"{kind + '_' + str(size):<18}{name:<13}{secs:>10.3f}{len(lines) / secs:>14,.0f}{parsed:>10}")
+                if args.json:
+                    with open(args.json, "a", encoding="utf-8") as out:
+                        out.write(json.dumps({
+                            "at": stamp, "dataset": kind, "size": size, "parser": name,
+                            "seconds": round(secs, 4), "lines_per_sec": round(len(lines) / secs),
+                            "parsed": parsed,
+                        }) + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -5,39 +5,45 @@
 import os
 import json
 import shutil
+import asyncio
 import logging
-from datetime import datetime, timedelta
 from telegram import (
-    Update, InlineKeyboardButton, InlineKeyboardMarkup, Document, InputFile
+    Update, InlineKeyboardButton, InlineKeyboardMarkup, Document
 )
+from telegram.error import TelegramError, BadRequest
 from telegram.ext import (
     ApplicationBuilder, CommandHandler, MessageHandler, CallbackQueryHandler,
     ContextTypes, filters, ConversationHandler
 )
-from config import BOT_TOKEN, ADMINS, DAILY_SEPARATION_LIMIT, MAX_FILE_SIZE_MB
-from core.storage import (
-    get_user_dir, get_uploaded_dir, get_generated_dir,
-    get_total_upload_size, save_upload, is_txt_file, list_user_txt_files,
-    mark_file_opened, delete_inactive_files, delete_user_data
-)
-from core.parser import (
-    parse_line, clean_format_block, separate_by_level, build_output_line
+from config import (
+    BOT_TOKEN, ADMINS, DAILY_SEPARATION_LIMIT, MAX_FILE_SIZE_MB, SESSION_FLUSH_SECONDS,
+    DEDUP_MODE, RETENTION_SWEEP_SECONDS, METRICS_PORT, LOOP_PROFILE, WEBHOOK_URL
 )
-from core.viewer import (
-    format_account_message, load_resume, save_resume, save_label
-)
-from core.gpt_fallback import fix_line_with_gpt
-from core.admin import (
-    is_admin, set_group_target, get_group_target,
-    send_file_to_group, get_all_user_ids
+from core.storage import (
+    get_user_dir,
+    get_total_upload_size, get_upload_path, save_upload, is_txt_file, list_user_txt_files,
+    mark_file_opened, sweep_inactive, delete_user_data, reconcile_all_ledgers, preload_ledgers
 )
+from core.fileio import run_io, shutdown_io
+from core.utils import format_size
+from core.retention import pending as retention_pending
+from core.state import take_daily, refund_daily, worker_index
+from core.metrics import inc, instrument_handler, summary_text, start_metrics_server, start_profiler
+from core.gpt_cache import get_cache_stats
+from core.viewer import save_label, export_labels
+from core.store import count_accounts, open_store, get_build_progress, pop_build_stats
+from core.workers import run_cpu, shutdown_pool
+from core.render import render_clean, render_partition, render_hits
+from core.search import parse_query, load_index, build_index, run_query
+from core.partition import load_rules, rule_label
+from core.output import read_output, discard_output
+from core.fanout import start_fanout, resume_fanout, is_running as is_fanout_running
+from core.sessions import open_session, get_session, flush_sessions, expire_sessions
+from core.admin import is_admin, set_group_target
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Session state
-user_sessions = {}
-
 # ─────────── Start & Game Selection ───────────
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     keyboard = [
@@ -66,24 +72,29 @@ async def game_choice(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.callback_query.edit_message_text("CODM coming soon.")
 
 # ─────────── File Upload & Limits ───────────
+BOT_API_DOWNLOAD_LIMIT = 20 * 1024 * 1024  # getFile refuses anything larger
+
 async def handle_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
     doc = update.message.document
     uid = update.effective_user.id
     if not is_txt_file(doc.file_name):
         return await update.message.reply_text("❌ Only .txt files allowed.")
-    if get_total_upload_size(uid) + doc.file_size/1e6 > MAX_FILE_SIZE_MB:
+    # quota counts stored (compressed) bytes, known only once the file is saved
+    if get_total_upload_size(uid) >= MAX_FILE_SIZE_MB:
         return await update.message.reply_text(
-            "⚠️ Upload limit reached (30MB).\nUse /deletedata to clear."
+            f"⚠️ Upload limit reached ({MAX_FILE_SIZE_MB}MB).\nUse /deletedata to clear."
+        )
+    if doc.file_size and doc.file_size > BOT_API_DOWNLOAD_LIMIT:
+        return await update.message.reply_text("❌ Telegram only lets bots download files up to 20MB.")
+    # Save: PTB downloads the whole body into memory (at most the 20MB above);
+    # writing, compressing and parsing it all happen off the event loop
+    content = await (await doc.get_file()).download_as_bytearray()
+    path = await save_upload(uid, doc.file_name, content, MAX_FILE_SIZE_MB)
+    if path is None:
+        return await update.message.reply_text(
+            f"⚠️ This file would exceed your {MAX_FILE_SIZE_MB}MB limit.\nUse /deletedata to clear."
         )
-    # Save
-    blob = await (await doc.get_file()).download_as_bytearray()
-    path = save_upload(uid, doc.file_name, blob)
     mark_file_opened(uid, doc.file_name)
-    # enforce 1 separation/day
-    sessions = context.user_data.get("daily_sep", {})
-    last = sessions.get(path)
-    if last and datetime.fromisoformat(last) > datetime.now() - timedelta(days=1):
-        await update.message.reply_text("❌ You can only separate one file per day.")
     keyboard = [
         [InlineKeyboardButton("🔎 Check", callback_data=f"action_check|{path}")],
         [InlineKeyboardButton("🧹 Clean", callback_data=f"action_clean|{path}")],
@@ -118,27 +129,78 @@ async def action_router(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif cmd.startswith("select"):
         return await action_router(update, context)
 
+# ─────────── Background Work w/ Progress ───────────
+PROGRESS_EVERY=3
+STATUS_DELAY=1  # jobs done sooner than this (e.g. the store already exists) get no status
+
+# Await a long job while keeping a status message updated; the job itself runs
+# off the handler (store builds in the background, rendering in the worker pool)
+async def run_with_progress(message, text, aw, progress=None):
+    task=asyncio.ensure_future(aw)
+    await asyncio.wait({task},timeout=STATUS_DELAY)
+    if task.done():
+        return task.result()
+    status=await message.reply_text(f"⏳ {text}…")
+    shown=None
+    while not task.done():
+        await asyncio.wait({task},timeout=PROGRESS_EVERY)
+        pct=progress() if progress else None
+        if not task.done() and pct is not None and pct!=shown:
+            shown=pct
+            try: await status.edit_text(f"⏳ {text}… {pct:.0%}")
+            except TelegramError: pass
+    try: await status.delete()
+    except TelegramError: pass
+    return task.result()
+
+# Upload finished documents straight from memory (or their spill file, read
+# and decompressed on the I/O pool: the upload reads it all in one go); spill
+# files are removed even if a send fails partway (e.g. RetryAfter)
+async def send_outputs(message, outputs):
+    try:
+        for out in outputs:
+            data=out["data"] if "data" in out else await run_io(read_output,out)
+            await message.reply_document(data, filename=out["name"])
+    finally:
+        for out in outputs:
+            discard_output(out)
+
+# Build (or reuse) the upload's store; returns how many accounts it holds
+async def load_with_progress(update, path):
+    count=await run_with_progress(
+        update.callback_query.message,"Reading file",
+        count_accounts(path,update.effective_user.id),
+        lambda: get_build_progress(path)
+    )
+    stats=pop_build_stats(path)
+    if stats and stats["duplicates"]:
+        await update.callback_query.message.reply_text(
+            f"♻️ {stats['duplicates']} account(s) were already in your earlier uploads"
+            + (" and were skipped." if DEDUP_MODE=="skip" else ".")
+        )
+    return count
+
 # ─────────── Checking Time w/ Resume ───────────
 async def start_check(update, context, uid, path):
-    # load or init session
-    lines = open(path, encoding="utf-8").read().splitlines()
-    accounts=[]
-    for l in lines:
-        a=parse_line(l) or await fix_line_with_gpt(l)
-        if not a: continue
-        accounts.append(a)
-    if not accounts:
+    # load or init session (resumes at the saved position for this file)
+    mark_file_opened(uid,os.path.basename(path))
+    await load_with_progress(update,path)
+    sess=await open_session(uid,path)
+    if not sess:
         return await update.callback_query.message.reply_text(
             "❌ No valid accounts."
         )
-    sess={"accs":accounts,"i":0,"path":path,"uid":uid}
-    user_sessions[uid]=sess
     await show_one(update, context, uid)
 
-async def show_one(update, context, uid):
-    sess=user_sessions[uid]
-    acc=sess["accs"][sess["i"]]; total=len(sess["accs"])
-    msg=format_account_message(acc,sess["i"],total)
+async def resume_check(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.callback_query.answer()
+    uid=update.effective_user.id
+    if not await get_session(uid):
+        return await update.callback_query.message.reply_text("Nothing to resume.")
+    await show_one(update, context, uid)
+
+# Keyboards never change, so they are built once and reused for every message
+def _check_keyboard(last):
     kb=[
         [InlineKeyboardButton("◀️",callback_data="nav_prev"),
          InlineKeyboardButton("▶️",callback_data="nav_next")],
@@ -148,70 +210,159 @@ async def show_one(update, context, uid):
         [InlineKeyboardButton("❓ Incorrect",callback_data="lbl_Incorrect"),
          InlineKeyboardButton("🚫 Banned",callback_data="lbl_Banned")]
     ]
-    if sess["i"]==total-1:
+    if last:
         kb.append([InlineKeyboardButton("📤 Extract",callback_data="action_extract")])
-    await update.callback_query.message.reply_text(
-        msg, reply_markup=InlineKeyboardMarkup(kb)
-    )
+    return InlineKeyboardMarkup(kb)
+
+CHECK_KB=_check_keyboard(False)
+CHECK_KB_LAST=_check_keyboard(True)
+
+# Send the current account as a new message, or edit the existing one in place
+async def show_one(update, context, uid, edit=False):
+    sess=await get_session(uid)
+    msg=await sess.render()
+    kb=CHECK_KB_LAST if sess.i==sess.total-1 else CHECK_KB
+    if edit:
+        try:
+            await update.callback_query.edit_message_text(msg, reply_markup=kb)
+        except BadRequest as e:
+            if "not modified" not in str(e).lower(): raise
+    else:
+        await update.callback_query.message.reply_text(msg, reply_markup=kb)
+    await sess.prefetch()
 
 async def check_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     data=update.callback_query.data
     uid=update.callback_query.from_user.id
-    sess=user_sessions.get(uid)
-    await update.callback_query.answer()
-    if not sess: return await update.callback_query.edit_message_text("No session")
-    if data=="nav_next" and sess["i"]<len(sess["accs"])-1: sess["i"]+=1
-    if data=="nav_prev" and sess["i"]>0: sess["i"]-=1
+    sess=await get_session(uid)
+    if not sess:
+        await update.callback_query.answer()
+        return await update.callback_query.edit_message_text("No session")
+    changed=False
+    if data=="nav_next": changed=sess.move(1)
+    if data=="nav_prev": changed=sess.move(-1)
     if data.startswith("lbl_"):
         lbl=data.split("_")[1]
-        acc=sess["accs"][sess["i"]]
-        save_label(uid,os.path.basename(sess["path"]),lbl)
+        await run_io(save_label,uid,sess.session_id,sess.current(),lbl)
+        sess.invalidate()
+        changed=True
     if data=="action_extract":
-        folder=os.path.join(get_generated_dir(uid),os.path.basename(sess["path"]))
-        for f in os.listdir(folder):
-            if f.endswith(".txt"):
-                await update.callback_query.message.reply_document(
-                    InputFile(os.path.join(folder,f))
-                )
-        return
-    await update.callback_query.message.delete()
-    await show_one(update, context, uid)
+        await update.callback_query.answer()
+        outs=await run_io(export_labels,uid,sess.session_id)
+        return await send_outputs(update.callback_query.message,outs)
+    if not changed:
+        return await update.callback_query.answer()
+    # answer and edit go out together: one round-trip per click
+    await asyncio.gather(update.callback_query.answer(),
+                         show_one(update, context, uid, edit=True))
 
 # ─────────── Clean & Separate ───────────
 async def do_clean(update, context, uid, path):
-    lines=open(path,encoding="utf-8").read().splitlines()
-    pars=[]
-    for l in lines:
-        a=parse_line(l) or await fix_line_with_gpt(l)
-        if a: pars.append(a)
-    if not pars: return await update.callback_query.message.reply_text("No valid lines")
-    txt="\n\n".join(clean_format_block(a) for a in pars)
-    name="cleaned.txt"
-    open(name,"w",encoding="utf-8").write(txt)
-    await update.callback_query.message.reply_document(InputFile(name))
-    os.remove(name)
+    if not await load_with_progress(update,path): return await update.callback_query.message.reply_text("No valid lines")
+    out=await run_with_progress(update.callback_query.message,"Cleaning",
+                                run_cpu(render_clean,path))
+    await send_outputs(update.callback_query.message,[out])
+
+SEPARATE_RULES=load_rules()
 
 async def separate_prompt(update, context, uid, path):
-    kb=[[InlineKeyboardButton("✔️ Yes",callback_data=f"sep_yes|{path}"),
-         InlineKeyboardButton("❌ No",callback_data=f"sep_no|{path}")]]
+    kb=[[InlineKeyboardButton(f"✔️ {rule_label(r)} (clean)",callback_data=f"sep_yes|{i}|{path}"),
+         InlineKeyboardButton(f"❌ {rule_label(r)} (raw)",callback_data=f"sep_no|{i}|{path}")]
+        for i,r in enumerate(SEPARATE_RULES)]
     await update.callback_query.message.reply_text(
-        "Clean format before separation?",reply_markup=InlineKeyboardMarkup(kb)
+        "Separate by what? Clean format before separation?",reply_markup=InlineKeyboardMarkup(kb)
     )
 
 async def do_sep_action(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    cmd,path=update.callback_query.data.split("|")
+    cmd,i,path=update.callback_query.data.split("|",2)
     clean=(cmd=="sep_yes")
-    lines=open(path,encoding="utf-8").read().splitlines()
-    pars=[parse_line(l) or await fix_line_with_gpt(l) for l in lines]
-    sep=separate_by_level([a for a in pars if a])
-    for lvl,arr in sep.items():
-        if not arr: continue
-        fn=f"{lvl}.txt"
-        with open(fn,"w",encoding="utf-8") as f:
-            for a in arr:
-                f.write((clean_format_block(a) if clean else build_output_line(a))+"\n\n")
-        await update.callback_query.message.reply_document(InputFile(fn))
-        os.remove(fn)
+    rule=SEPARATE_RULES[int(i)]
+    uid=update.effective_user.id
+    if not await load_with_progress(update,path):
+        return await update.callback_query.message.reply_text("No valid lines")
+    # Daily limit is shared by every worker process (core.state); only a
+    # separation that actually goes out uses it up
+    if not await run_io(take_daily,uid,"separate",DAILY_SEPARATION_LIMIT):
+        return await update.callback_query.message.reply_text(
+            f"❌ You can only separate {DAILY_SEPARATION_LIMIT} file(s) per day."
+        )
+    try:
+        outs=await run_with_progress(update.callback_query.message,"Separating",
+                                     run_cpu(render_partition,path,rule,clean))
+        await send_outputs(update.callback_query.message,outs)
+    except BaseException:
+        await run_io(refund_daily,uid,"separate")
+        raise
+
+# ─────────── Search ───────────
+FIND_PAGE=10
+FIND_USAGE=("Usage: /find country=PH level>=80 banned=false\n"
+            "Fields: country, rank, level, banned. Quote values with spaces: rank=\"Mythical Glory\"")
+
+async def collect_find(uid, conds, message):
+    hits=[]
+    for f in list_user_txt_files(uid):
+        path=get_upload_path(uid,f)
+        idx=await run_io(load_index,path)
+        if idx is None:
+            if not await count_accounts(path,uid): continue
+            await run_with_progress(message,f"Indexing {f}",run_cpu(build_index,path))
+            idx=await run_io(load_index,path)
+        ids=run_query(idx,conds) if idx else []
+        if ids: hits.append((path,idx["build"],ids))
+    return hits
+
+async def find_page_text(q, page):
+    total=sum(len(ids) for _,_,ids in q["hits"])
+    start=page*FIND_PAGE
+    lines=[f"🔎 {q['text']}\n{total} match(es)"]
+    skip=start
+    for path,build,ids in q["hits"]:
+        if skip>=len(ids):
+            skip-=len(ids); continue
+        store=await run_io(open_store,path)
+        if store is None: continue
+        if store.build!=build:  # rebuilt since the search: its ids no longer apply
+            store.close(); continue
+        try:
+            for i in ids[skip:skip+FIND_PAGE-(len(lines)-1)]:
+                a=store[i]
+                lines.append(f"{start+len(lines)}. {a['uid']} ({a['server_id']}) · Lv {a['level']} · "
+                             f"{a['rank']} · {a['country']}{' · 🚫' if a['banned'] else ''}"
+                             f" — {os.path.basename(path)}")
+        finally:
+            store.close()
+        skip=0
+        if len(lines)-1>=FIND_PAGE: break
+    kb=[]
+    if page>0: kb.append(InlineKeyboardButton("◀️",callback_data="find_prev"))
+    if start+FIND_PAGE<total: kb.append(InlineKeyboardButton("▶️",callback_data="find_next"))
+    kb=[kb] if kb else []
+    if total: kb.append([InlineKeyboardButton("📥 Download",callback_data="find_dl")])
+    return "\n".join(lines),InlineKeyboardMarkup(kb)
+
+async def find_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    text=" ".join(context.args)
+    if not text: return await update.message.reply_text(FIND_USAGE)
+    try:
+        conds=parse_query(text)
+    except ValueError as e:
+        return await update.message.reply_text(f"❌ {e}\n\n{FIND_USAGE}")
+    hits=await collect_find(update.effective_user.id,conds,update.message)
+    q=context.user_data["find"]={"text":text,"hits":hits,"page":0}
+    msg,kb=await find_page_text(q,0)
+    await update.message.reply_text(msg,reply_markup=kb)
+
+async def find_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.callback_query.answer()
+    q=context.user_data.get("find")
+    if not q: return await update.callback_query.edit_message_text("Search expired, run /find again.")
+    if update.callback_query.data=="find_dl":
+        out=await run_cpu(render_hits,q["hits"])
+        return await send_outputs(update.callback_query.message,[out])
+    q["page"]+=1 if update.callback_query.data=="find_next" else -1
+    msg,kb=await find_page_text(q,q["page"])
+    await update.callback_query.edit_message_text(msg,reply_markup=kb)
 
 # ─────────── Admin Upload Selector & Queue ───────────
 async def admin_upload_selector(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -220,40 +371,108 @@ async def admin_upload_selector(update: Update, context: ContextTypes.DEFAULT_TY
     await update.message.reply_text("Choose upload type:",reply_markup=InlineKeyboardMarkup(kb))
 
 async def admin_up_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update.effective_user.id): return
     typ=update.callback_query.data.split("|")[1].lower()
-    group=get_group_target(typ)
-    for uid in get_all_user_ids():
-        upth=get_uploaded_dir(uid)
-        for f in os.listdir(upth):
-            if f.endswith(".txt"):
-                p=os.path.join(upth,f)
-                await send_file_to_group(context,p,typ,uid)
-    await update.callback_query.answer("Done.")
+    if is_fanout_running():
+        return await update.callback_query.answer("An upload is already running.")
+    if not await start_fanout(context.application,typ,update.effective_chat.id):
+        return await update.callback_query.answer("No group set for this type.")
+    await update.callback_query.answer("Queued.")
+
+async def set_sendhere(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update.effective_user.id): return
+    label=update.message.text.split()[0].lstrip("/").split("@")[0][len("sendhere"):]
+    if await run_io(set_group_target,label,update.effective_chat.id):
+        await update.message.reply_text(f"✅ {label.capitalize()} files will be sent here.")
+
+async def stats_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update.effective_user.id): return
+    cache=await run_io(get_cache_stats)
+    await update.message.reply_text(
+        summary_text()+f"\n🧠 GPT cache: {cache['entries']} entries, {cache['hit_rate']:.0%} hit rate"
+        f"\n🗓️ Retention: {retention_pending()} uploads tracked"
+    )
 
 # ─────────── Cleanup & Deletion Jobs ───────────
-async def daily_cleanup(context):
-    delete_inactive_files()
+async def retention_sweep(context):
+    reclaimed=await run_io(sweep_inactive)
+    if reclaimed["files"]:
+        inc("retention_files_deleted_total",reclaimed["files"])
+        inc("retention_bytes_reclaimed_total",reclaimed["bytes"])
+        logger.info("Retention: deleted %d upload(s), reclaimed %s",
+                    reclaimed["files"],format_size(reclaimed["bytes"]))
+
+async def reconcile_usage(context):
+    await run_io(reconcile_all_ledgers)
+
+async def deletedata(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await run_io(delete_user_data,update.effective_user.id)
+    await update.message.reply_text("🗑️ All your files have been deleted.")
+
+async def session_maintenance(context):
+    await run_io(flush_sessions)
+    expire_sessions()
+
+async def on_startup(app):
+    await preload_ledgers()
+    resume_fanout(app)
+    if METRICS_PORT:
+        # one port per webhook worker: METRICS_PORT, METRICS_PORT+1, ...
+        app.bot_data["metrics_server"]=await start_metrics_server(METRICS_PORT+worker_index())
+    if LOOP_PROFILE:
+        start_profiler()
+
+async def on_shutdown(app):
+    if app.bot_data.get("metrics_server"):
+        app.bot_data["metrics_server"].close()
+    flush_sessions()
+    shutdown_io()
+    shutdown_pool()
 
 # ─────────── Bot Setup ───────────
-def main():
-    app=ApplicationBuilder().token(BOT_TOKEN).build()
-    # Jobs
-    run_every=24*3600
-    app.job_queue.run_repeating(daily_cleanup, interval=run_every, first=10)
+# Fully wired Application. `request` swaps out the HTTP layer to the Bot API
+# (benchmarks/load_test.py passes a fake one). `updater=False` builds a worker
+# fed by core.webhook instead of by polling. Jobs only run once started.
+def build_application(token=BOT_TOKEN, request=None, updater=True):
+    builder=(ApplicationBuilder().token(token)
+             .concurrent_updates(True)  # one slow upload must not hold up other users
+             .post_init(on_startup).post_shutdown(on_shutdown))
+    if not updater:
+        builder=builder.updater(None)
+    if request is not None:
+        builder=builder.request(request).get_updates_request(request)
+    app=builder.build()
+    # Jobs (need the job-queue extra, see requirements.txt)
+    app.job_queue.run_repeating(retention_sweep, interval=RETENTION_SWEEP_SECONDS, first=10)
+    app.job_queue.run_repeating(reconcile_usage, interval=3600, first=60)
+    app.job_queue.run_repeating(session_maintenance, interval=SESSION_FLUSH_SECONDS, first=SESSION_FLUSH_SECONDS)
     # Handlers
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CallbackQueryHandler(game_choice,pattern="^game_.*"))
+    app.add_handler(CallbackQueryHandler(resume_check,pattern="^mlbb_resume$"))
     app.add_handler(MessageHandler(filters.Document.ALL,handle_file))
     app.add_handler(CallbackQueryHandler(check_callback,pattern="^(nav_|lbl_|action_extract)"))
     app.add_handler(CallbackQueryHandler(action_router,pattern="^action_"))
     app.add_handler(CallbackQueryHandler(do_sep_action,pattern="^sep_"))
-    app.add_handler(CallbackQueryHandler(callback_router,pattern="^(clean_format|separate_levels)"))
-    app.add_handler(CommandHandler("broadcast",broadcast))
     app.add_handler(CommandHandler("deletedata",deletedata))
     app.add_handler(CommandHandler(["sendhereraw","sendheregood","sendhereaverage","sendheretrash","sendhereincorrect","sendherebanned"], set_sendhere))
+    app.add_handler(CommandHandler("find", find_cmd))
+    app.add_handler(CallbackQueryHandler(find_callback, pattern="^find_"))
     app.add_handler(CommandHandler("upload", admin_upload_selector))
     app.add_handler(CallbackQueryHandler(admin_up_handler, pattern="^admin_up"))
-    app.run_polling()
+    app.add_handler(CommandHandler("stats", stats_cmd))
+    # Latency / outcome / in-flight metrics for every handler
+    for group in app.handlers.values():
+        for h in group:
+            h.callback=instrument_handler(h.callback)
+    return app
+
+def main():
+    if WEBHOOK_URL:
+        from core.webhook import run_webhook
+        run_webhook(build_application)
+    else:
+        build_application().run_polling()
 
 if __name__=="__main__":
     main()
@@ -12,6 +12,85 @@ ADMINS = [int(i) for i in os.getenv("ADMINS", "").split(",") if i]
 # File limits
 MAX_FILE_SIZE_MB       = int(os.getenv("MAX_FILE_SIZE_MB", 30))
 DAILY_SEPARATION_LIMIT = int(os.getenv("DAILY_SEPARATION_LIMIT", 1))
+INACTIVE_DAYS          = int(os.getenv("INACTIVE_DAYS", 7))  # unopened uploads older than this are deleted
+# Retention runs as small sweeps: every RETENTION_SWEEP_SECONDS, at most
+# RETENTION_SWEEP_FILES expiry-index entries are examined
+RETENTION_SWEEP_SECONDS = int(os.getenv("RETENTION_SWEEP_SECONDS", 60))
+RETENTION_SWEEP_FILES   = int(os.getenv("RETENTION_SWEEP_FILES", 50))
+
+# Lines parsed (and GPT-repaired) per step when building an upload's store
+STORE_CHUNK_LINES      = int(os.getenv("STORE_CHUNK_LINES", 5000))
+
+# Review sessions: idle sessions are dropped from memory after this many seconds;
+# cursors are flushed to disk every SESSION_FLUSH_SECONDS
+SESSION_IDLE_TTL       = int(os.getenv("SESSION_IDLE_TTL", 1800))
+SESSION_FLUSH_SECONDS  = int(os.getenv("SESSION_FLUSH_SECONDS", 5))
+
+# Admin bulk upload: parallel senders and Telegram send limits
+FANOUT_CONCURRENCY     = int(os.getenv("FANOUT_CONCURRENCY", 4))
+FANOUT_GLOBAL_PER_MIN  = int(os.getenv("FANOUT_GLOBAL_PER_MIN", 1800))  # ~30 msg/s bot-wide
+FANOUT_CHAT_PER_MIN    = int(os.getenv("FANOUT_CHAT_PER_MIN", 20))      # per group chat
+
+# Worker processes for bulk parse/format/separate jobs (keeps the event loop free)
+WORKER_PROCESSES       = int(os.getenv("WORKER_PROCESSES", max(1, (os.cpu_count() or 2) - 1)))
+
+# Threads for blocking filesystem work, and how long small metadata writes
+# (ledgers, meta sidecars) are coalesced before hitting disk
+IO_THREADS             = int(os.getenv("IO_THREADS", 4))
+IO_FLUSH_DELAY         = float(os.getenv("IO_FLUSH_DELAY", 0.5))
+
+# gzip level for stored uploads (0 = store as-is) and for generated documents
+# that spill to disk; quotas count the stored (compressed) bytes
+UPLOAD_COMPRESS_LEVEL  = int(os.getenv("UPLOAD_COMPRESS_LEVEL", 6))
+OUTPUT_COMPRESS_LEVEL  = int(os.getenv("OUTPUT_COMPRESS_LEVEL", 1))
+
+# Generated documents stay in memory up to OUTPUT_SPOOL_MB, then spill to a
+# unique temp file; separations larger than OUTPUT_ZIP_MIN_MB or with more than
+# OUTPUT_ZIP_MAX_FILES documents go out as one zip (set OUTPUT_ZIP_MIN_MB to -1
+# to always send separate files)
+OUTPUT_SPOOL_MB        = float(os.getenv("OUTPUT_SPOOL_MB", 8))
+OUTPUT_ZIP_MIN_MB      = float(os.getenv("OUTPUT_ZIP_MIN_MB", 5))
+OUTPUT_ZIP_MAX_FILES   = int(os.getenv("OUTPUT_ZIP_MAX_FILES", 5))
+OUTPUT_TMP_DIR         = os.getenv("OUTPUT_TMP_DIR") or None  # None = system temp dir
+
+# Cross-upload dedup of accounts keyed on (uid, server_id) and email:
+# "skip" drops repeats from new uploads, "report" only counts them, "off" disables.
+# DEDUP_GLOBAL also checks against every user's uploads, not just your own.
+DEDUP_MODE             = os.getenv("DEDUP_MODE", "skip")
+DEDUP_GLOBAL           = os.getenv("DEDUP_GLOBAL", "0") == "1"
+
+# Separation presets offered to users: ";"-separated rules, each a ","-separated
+# combination of level, rank, country and banned
+SEPARATE_RULES         = os.getenv("SEPARATE_RULES", "level;level,country;level,rank;level,banned")
+
+# Instrumentation: METRICS_PORT serves Prometheus text at /metrics on localhost
+# (0 = off); LOOP_PROFILE=1 samples the event loop (lag + hot spots in /stats)
+METRICS_PORT           = int(os.getenv("METRICS_PORT", 0))
+LOOP_PROFILE           = os.getenv("LOOP_PROFILE", "0") == "1"
 
 # Base storage directory for all user files
 BASE_DIR = os.getenv("BASE_DIR", "user_data")
+
+# State shared between bot processes (review cursors, labels, daily limits,
+# admin targets); SQLite in WAL mode
+STATE_DB = os.getenv("STATE_DB", os.path.join(BASE_DIR, "state.sqlite3"))
+
+# Webhook mode: with WEBHOOK_URL set, updates arrive over HTTP on
+# WEBHOOK_LISTEN:WEBHOOK_PORT (put a TLS-terminating proxy in front) and are
+# handed to WEBHOOK_WORKERS bot processes, each user always to the same one.
+# Unset, the bot long-polls in a single process. WEBHOOK_SECRET is required in
+# webhook mode; Telegram sends it with every update.
+WEBHOOK_URL     = os.getenv("WEBHOOK_URL")
+WEBHOOK_LISTEN  = os.getenv("WEBHOOK_LISTEN", "127.0.0.1")
+WEBHOOK_PORT    = int(os.getenv("WEBHOOK_PORT", 8443))
+WEBHOOK_SECRET  = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", os.cpu_count() or 1))
+
+# GPT repair
+OPENAI_API_BASE   = os.getenv("OPENAI_API_BASE")  # point at a local stub for testing
+GPT_MODEL         = os.getenv("GPT_MODEL", "gpt-3.5-turbo")
+GPT_BATCH_SIZE    = int(os.getenv("GPT_BATCH_SIZE", 20))
+GPT_CONCURRENCY   = int(os.getenv("GPT_CONCURRENCY", 4))
+GPT_RATE_PER_MIN  = int(os.getenv("GPT_RATE_PER_MIN", 60))
+GPT_MAX_RETRIES   = int(os.getenv("GPT_MAX_RETRIES", 3))
+GPT_CACHE_MAX_ENTRIES = int(os.getenv("GPT_CACHE_MAX_ENTRIES", 200000))
@@ -1,8 +1,12 @@
 import os
 import json
 from config import BASE_DIR, ADMINS
-from core.utils import readable_size
+from core.utils import format_size
+from core.compress import open_binary, scan
 from telegram import InputFile
+from telegram.error import RetryAfter
+from core.metrics import timed
+from core import state
 
 SEND_TARGET_FILE = "admin_targets.json"
 
@@ -11,36 +15,53 @@ LABEL_TARGETS = ["raw", "good", "average", "trash", "incorrect", "banned"]
 def is_admin(user_id: int):
     return user_id in ADMINS
 
+# Group targets live in the shared state database (core.state), so a target
+# set through any bot process applies to all of them. A legacy
+# admin_targets.json is imported once and renamed out of the way.
+def _import_legacy_targets():
+    if not os.path.exists(SEND_TARGET_FILE):
+        return
+    try:
+        with open(SEND_TARGET_FILE) as f:
+            data = json.load(f)
+    except ValueError:
+        data = {}
+    for label, group_id in data.items():
+        if label not in state.get_targets():
+            state.set_target(label, group_id)
+    os.replace(SEND_TARGET_FILE, f"{SEND_TARGET_FILE}.imported")
+
 def set_group_target(label, group_id):
     if label not in LABEL_TARGETS:
         return False
-    data = load_group_targets()
-    data[label] = group_id
-    json.dump(data, open(SEND_TARGET_FILE, "w"), indent=2)
+    _import_legacy_targets()
+    state.set_target(label, group_id)
     return True
 
 def get_group_target(label):
-    data = load_group_targets()
-    return data.get(label)
+    return load_group_targets().get(label)
 
 def load_group_targets():
-    if os.path.exists(SEND_TARGET_FILE):
-        return json.load(open(SEND_TARGET_FILE))
-    return {}
-
-def count_lines(filepath):
-    with open(filepath, encoding="utf-8") as f:
-        return sum(1 for _ in f)
+    _import_legacy_targets()
+    return state.get_targets()
 
-async def send_file_to_group(context, file_path, type_str, from_user):
+# `info` is the upload's ledger entry; when given, its precomputed size and
+# line count are used instead of re-reading the file. Uploads stored
+# compressed are sent as their original text. RetryAfter is re-raised so callers
+# that pace sends (core.fanout) can back off.
+@timed("send_file_to_group")
+async def send_file_to_group(context, file_path, type_str, from_user, info=None, group_id=None):
     label = type_str.lower()
-    group_id = get_group_target(label)
+    group_id = group_id or get_group_target(label)
     if not group_id:
         return False
 
     filename = os.path.basename(file_path)
-    size = readable_size(file_path)
-    lines = count_lines(file_path)
+    if info and "raw_size" in info:
+        raw_size, lines = info["raw_size"], info["lines"]
+    else:
+        raw_size, lines = scan(file_path)
+    size = format_size(raw_size)
 
     caption = (
         f"📎 {filename}\n"
@@ -52,9 +73,11 @@ async def send_file_to_group(context, file_path, type_str, from_user):
     )
 
     try:
-        with open(file_path, "rb") as f:
+        with open_binary(file_path) as f:
             await context.bot.send_document(chat_id=group_id, document=InputFile(f, filename), caption=caption)
         return True
+    except RetryAfter:
+        raise
     except Exception as e:
         print("Error sending file:", e)
         return False
@@ -0,0 +1,52 @@
+import os
+import gzip
+from config import UPLOAD_COMPRESS_LEVEL
+
+# Transparent gzip storage for uploads and spilled outputs.
+#
+# Combo lists are repetitive text and typically shrink several times. Files
+# are recognised by their gzip magic rather than by name, so uploads keep
+# their `.txt` names and files stored before compression was enabled are
+# still read as they are. Readers always get a decompressing stream, so
+# parsing stays line by line and nothing is ever inflated in full.
+
+GZIP_MAGIC = b"\x1f\x8b"
+READ_CHUNK = 1 << 20
+
+def is_compressed(path):
+    with open(path, "rb") as f:
+        return f.read(2) == GZIP_MAGIC
+
+# Binary stream of the file's original contents
+def open_binary(path):
+    return gzip.open(path, "rb") if is_compressed(path) else open(path, "rb")
+
+# Offset into the stored (possibly compressed) file, for progress reporting
+def stored_position(stream):
+    return getattr(stream, "fileobj", stream).tell()
+
+# Compress `src` into `dst` (atomically) and remove `src`; returns the
+# original size and line count, counted on the way through
+def compress_file(src, dst, level=UPLOAD_COMPRESS_LEVEL):
+    raw_size = lines = 0
+    tmp = f"{dst}.{os.getpid()}.tmp"
+    # no name or timestamp in the gzip header: the same content always stores
+    # as the same bytes, so a re-upload still matches its store's hash
+    with open(src, "rb") as fin, open(tmp, "wb") as raw, \
+            gzip.GzipFile(filename="", mode="wb", compresslevel=level, fileobj=raw, mtime=0) as fout:
+        for chunk in iter(lambda: fin.read(READ_CHUNK), b""):
+            raw_size += len(chunk)
+            lines += chunk.count(b"\n")
+            fout.write(chunk)
+    os.replace(tmp, dst)
+    os.remove(src)
+    return raw_size, lines
+
+# (original size, line count) of a stored file, streaming
+def scan(path):
+    raw_size = lines = 0
+    with open_binary(path) as f:
+        for chunk in iter(lambda: f.read(READ_CHUNK), b""):
+            raw_size += len(chunk)
+            lines += chunk.count(b"\n")
+    return raw_size, lines
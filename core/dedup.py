@@ -0,0 +1,271 @@
+import os
+import bisect
+import struct
+import hashlib
+import itertools
+import threading
+from array import array
+from config import BASE_DIR, DEDUP_GLOBAL, DEDUP_MODE
+
+# Compact dedup index of accounts already seen.
+#
+# Each account contributes two 64-bit keys: blake2b of (uid, server_id) and of
+# the lower-cased email. Every upload records the keys it contributed in a
+# `<file>.keys` sidecar that is committed together with its store, so an
+# upload is never filtered against its own keys when it is rebuilt, and
+# deleting it takes its keys with it. Only accounts the store keeps count:
+# under DEDUP_MODE "skip" a dropped duplicate leaves no keys behind, or a
+# rebuild of the upload it repeated would be filtered against them.
+#
+# In memory an index (per user, plus one global index) is a few sorted runs of
+# (key, build) pairs: array('Q') keys beside array('I') build ids, 12 bytes an
+# entry, searched with bisect. Runs of similar size are merged as they come
+# in, streaming, so there are only O(log n) of them. A build's keys are seen
+# by that build alone until it commits; entries of builds that were aborted,
+# replaced or deleted are dropped whenever their run is merged. Everything
+# here blocks and is called through core.fileio.run_io, never on the loop.
+#
+# Keys file: a sequence of runs, each a u64 count followed by that many sorted
+# u64 keys.
+
+COUNT = struct.Struct("<Q")
+MERGE_BLOCK = 1 << 15
+RUN_KEYS = 1 << 16
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+_build_ids = itertools.count(1)
+
+def account_keys(acc):
+    return (
+        _digest(f"id:{acc['uid']}:{acc['server_id']}"),
+        _digest(f"email:{acc['email'].strip().lower()}"),
+    )
+
+def _digest(text):
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+def keys_path(upload_path):
+    return f"{upload_path}.keys"
+
+def _read_runs(path):
+    runs = []
+    with open(path, "rb") as f:
+        while head := f.read(COUNT.size):
+            (n,) = COUNT.unpack(head)
+            run = array("Q")
+            run.fromfile(f, n)
+            runs.append(run)
+    return runs
+
+class DedupIndex:
+    def __init__(self):
+        self._runs = []        # [(keys, builds)], each sorted by key, largest first
+        self._live = {}        # committed build id -> owner (the upload it came from)
+        self._owners = {}      # owner -> its committed build id
+        self._pending = set()  # builds still in progress
+        self._sizes = {}       # build id -> entries it added
+        self._dead = 0         # entries of dead builds not yet merged away
+        self._lock = threading.Lock()
+
+    def begin(self):
+        build = next(_build_ids)
+        with self._lock:
+            self._pending.add(build)
+        return build
+
+    # Keys from `keys` that `build` (of upload `owner`) should treat as seen:
+    # its own earlier chunks and every other upload's committed keys
+    def find(self, keys, build, owner):
+        hits = set()
+        live = self._live
+        with self._lock:
+            for run_keys, run_builds in self._runs:
+                n = len(run_keys)
+                for key in keys:
+                    i = bisect.bisect_left(run_keys, key)
+                    while i < n and run_keys[i] == key:
+                        b = run_builds[i]
+                        if b == build or (b in live and live[b] != owner):
+                            hits.add(key)
+                            break
+                        i += 1
+        return hits
+
+    # `keys` must be sorted
+    def add(self, build, keys):
+        with self._lock:
+            self._sizes[build] = self._sizes.get(build, 0) + len(keys)
+            self._runs.append((keys, array("I", [build]) * len(keys)))
+            while len(self._runs) > 1 and len(self._runs[-2][0]) <= 2 * len(self._runs[-1][0]):
+                newer, older = self._runs.pop(), self._runs.pop()
+                self._runs.append(self._merge([older, newer]))
+
+    def commit(self, build, owner):
+        with self._lock:
+            self._pending.discard(build)
+            self._kill(self._owners.get(owner))
+            self._live[build] = owner
+            self._owners[owner] = build
+
+    def abort(self, build):
+        with self._lock:
+            self._pending.discard(build)
+            self._kill(build)
+
+    def forget(self, match):
+        with self._lock:
+            for owner in [o for o in self._owners if match(o)]:
+                self._kill(self._owners[owner])
+
+    # Register an upload's committed keys file (at load time)
+    def load(self, owner, path):
+        build = self.begin()
+        for run in _read_runs(path):
+            self.add(build, run)
+        self.commit(build, owner)
+
+    # Caller holds the lock
+    def _kill(self, build):
+        if build is None:
+            return
+        owner = self._live.pop(build, None)
+        if owner is not None and self._owners.get(owner) == build:
+            del self._owners[owner]
+        self._dead += self._sizes.pop(build, 0)
+        # mostly dead: compact everything into one run
+        if self._dead * 2 > sum(len(keys) for keys, _ in self._runs):
+            self._runs = [self._merge(self._runs)]
+
+    # Caller holds the lock; drops entries of dead builds
+    def _merge(self, runs):
+        keep = self._live.keys() | self._pending
+        while len(runs) > 1:
+            runs = [_merge_pair(*runs[i:i + 2]) if i + 1 < len(runs) else runs[i]
+                    for i in range(0, len(runs), 2)]
+        keys, builds = runs[0] if runs else (array("Q"), array("I"))
+        if self._dead:
+            before = len(keys)
+            keys = array("Q", itertools.compress(keys, map(keep.__contains__, builds)))
+            builds = array("I", filter(keep.__contains__, builds))
+            self._dead -= before - len(keys)
+        return keys, builds
+
+# Merge two sorted runs a block at a time: each step sorts (C-level, timsort
+# sees two ascending runs) at most 2 x MERGE_BLOCK entries, so there is never
+# a list of the whole index in memory
+def _merge_pair(a, b):
+    (ak, ab), (bk, bb) = a, b
+    keys, builds = array("Q"), array("I")
+    i = j = 0
+    while i < len(ak) or j < len(bk):
+        i2, j2 = min(i + MERGE_BLOCK, len(ak)), min(j + MERGE_BLOCK, len(bk))
+        # cut both blocks at the smaller of their last keys
+        if i2 < len(ak) and (j2 == len(bk) or ak[i2 - 1] <= bk[j2 - 1]):
+            j2 = bisect.bisect_right(bk, ak[i2 - 1], j, j2)
+        elif j2 < len(bk):
+            i2 = bisect.bisect_right(ak, bk[j2 - 1], i, i2)
+        block_keys, block_builds = ak[i:i2] + bk[j:j2], ab[i:i2] + bb[j:j2]
+        order = sorted(range(len(block_keys)), key=block_keys.__getitem__)
+        keys.extend(map(block_keys.__getitem__, order))
+        builds.extend(map(block_builds.__getitem__, order))
+        i, j = i2, j2
+    return keys, builds
+
+def _key_files(user_id):
+    if user_id is not None:
+        users = [user_id]
+    else:
+        users = [d for d in os.listdir(BASE_DIR) if d.isdigit()] if os.path.isdir(BASE_DIR) else []
+    for uid in users:
+        folder = os.path.join(BASE_DIR, str(uid), "uploaded")
+        if not os.path.isdir(folder):
+            continue
+        for name in os.listdir(folder):
+            if name.endswith(".keys"):
+                upload = name[:-len(".keys")]
+                owner = upload if user_id is not None else f"{uid}/{upload}"
+                yield owner, os.path.join(folder, name)
+
+# The user's index, or the global one for user_id None (loaded on first use)
+def get_index(user_id=None):
+    with _indexes_lock:
+        index = _indexes.get(user_id)
+        if index is None:
+            index = _indexes[user_id] = DedupIndex()
+            for owner, path in _key_files(user_id):
+                index.load(owner, path)
+    return index
+
+# Drop a deleted upload's keys from the indexes loaded in this process
+def forget_upload(user_id, name):
+    if user_id in _indexes:
+        _indexes[user_id].forget(lambda owner: owner == name)
+    if None in _indexes:
+        _indexes[None].forget(lambda owner: owner == f"{user_id}/{name}")
+
+def forget_user(user_id):
+    _indexes.pop(user_id, None)
+    if None in _indexes:
+        _indexes[None].forget(lambda owner: owner.startswith(f"{user_id}/"))
+
+class DedupFilter:
+    """Dedup for one build of one upload. check() takes the keys of a chunk
+    of accounts in file order. The keys of the accounts kept are gathered in
+    a small set, then written as a run to its `.keys` file and into the
+    indexes every RUN_KEYS keys; once commit() runs with the store's commit
+    they count as seen for other uploads. Blocking: call it through run_io."""
+
+    def __init__(self, user_id, upload_path):
+        name = os.path.basename(upload_path)
+        self.targets = [(get_index(user_id), name)]
+        if DEDUP_GLOBAL:
+            self.targets.append((get_index(), f"{user_id}/{name}"))
+        self.builds = [index.begin() for index, _ in self.targets]
+        self.path = keys_path(upload_path)
+        self.tmp = f"{self.path}.{os.getpid()}.tmp"
+        self._f = open(self.tmp, "wb")
+        self._recent = set()
+        self.duplicates = 0
+
+    # One flag per account: True if any of its keys was seen before
+    def check(self, chunk):
+        flat = [k for keys in chunk for k in keys]
+        seen = self._recent.intersection(flat)
+        for (index, owner), build in zip(self.targets, self.builds):
+            seen |= index.find(flat, build, owner)
+        dups = []
+        for keys in chunk:
+            dup = any(k in seen for k in keys)
+            dups.append(dup)
+            if not dup or DEDUP_MODE != "skip":
+                seen.update(keys)
+                self._recent.update(keys)
+        self.duplicates += sum(dups)
+        if len(self._recent) >= RUN_KEYS:
+            self._flush()
+        return dups
+
+    def _flush(self):
+        if not self._recent:
+            return
+        run = array("Q", sorted(self._recent))
+        self._recent.clear()
+        self._f.write(COUNT.pack(len(run)))
+        run.tofile(self._f)
+        for (index, _), build in zip(self.targets, self.builds):
+            index.add(build, run)
+
+    def commit(self):
+        self._flush()
+        self._f.close()
+        os.replace(self.tmp, self.path)
+        for (index, owner), build in zip(self.targets, self.builds):
+            index.commit(build, owner)
+
+    def abort(self):
+        self._f.close()
+        if os.path.exists(self.tmp):
+            os.remove(self.tmp)
+        for (index, _), build in zip(self.targets, self.builds):
+            index.abort(build)
@@ -0,0 +1,161 @@
+import os
+import time
+import asyncio
+from telegram.error import RetryAfter, TelegramError
+from config import BASE_DIR, FANOUT_CONCURRENCY, FANOUT_GLOBAL_PER_MIN, FANOUT_CHAT_PER_MIN
+from core.utils import RateLimiter
+from core.storage import list_user_ids, list_user_txt_files, get_upload_path, get_file_info
+from core.admin import get_group_target, send_file_to_group
+from core.state import owns_user
+from core.fileio import run_io, read_json, write_json_later, forget_writes
+
+# Background job queue for the admin /upload fan-out.
+#
+# The job (remaining files, counters, where to report progress) is checkpointed
+# to BASE_DIR/fanout_job.json, so an interrupted run resumes on the next start.
+# Sends run on FANOUT_CONCURRENCY workers paced by a bot-wide limiter and one
+# limiter per target chat; Telegram's RetryAfter is honoured and retried.
+
+JOB_FILE = os.path.join(BASE_DIR, "fanout_job.json")
+CHECKPOINT_EVERY = 5.0   # seconds between job-file writes
+PROGRESS_EVERY = 10.0    # seconds between progress message edits
+
+_running = None
+_global_limiter = RateLimiter(FANOUT_GLOBAL_PER_MIN)
+_chat_limiters = {}
+
+def _chat_limiter(chat_id):
+    limiter = _chat_limiters.get(chat_id)
+    if limiter is None:
+        limiter = _chat_limiters[chat_id] = RateLimiter(FANOUT_CHAT_PER_MIN)
+    return limiter
+
+def load_job():
+    return read_json(JOB_FILE)
+
+# Checkpoints go through the batched writer (core.fileio), off the loop
+def _save_job(job):
+    write_json_later(JOB_FILE, job)
+
+# Blocking: run it through run_io
+def _clear_job():
+    forget_writes(JOB_FILE)
+    if os.path.exists(JOB_FILE):
+        os.remove(JOB_FILE)
+
+def is_running():
+    return _running is not None and not _running.done()
+
+def _progress_text(job, finished=False):
+    head = "✅ Upload finished" if finished else "⏳ Uploading"
+    return (
+        f"{head} ({job['type']})\n"
+        f"Sent: {job['sent']} / {job['total']}\n"
+        f"Failed: {job['failed']}"
+    )
+
+async def _report(app, job, finished=False):
+    bot = app.bot
+    try:
+        if job.get("progress_msg_id"):
+            await bot.edit_message_text(
+                _progress_text(job, finished), chat_id=job["admin_chat"],
+                message_id=job["progress_msg_id"]
+            )
+        else:
+            msg = await bot.send_message(job["admin_chat"], _progress_text(job, finished))
+            job["progress_msg_id"] = msg.message_id
+    except TelegramError as e:
+        print("Fan-out progress error:", e)
+
+async def _send_one(app, job, user_id, name):
+    path = get_upload_path(user_id, name)
+    if not os.path.exists(path):
+        return False
+    while True:
+        await _global_limiter.wait()
+        await _chat_limiter(job["group"]).wait()
+        try:
+            return await send_file_to_group(
+                app, path, job["type"], user_id,
+                info=get_file_info(user_id, name), group_id=job["group"]
+            )
+        except RetryAfter as e:
+            await asyncio.sleep(e.retry_after)
+
+async def _run(app, job):
+    queue = asyncio.Queue()
+    for item in job["pending"]:
+        queue.put_nowait(tuple(item))
+    in_flight = set()
+    last = {"checkpoint": time.monotonic(), "progress": time.monotonic()}
+
+    async def checkpoint():
+        now = time.monotonic()
+        if now - last["checkpoint"] >= CHECKPOINT_EVERY:
+            # in-flight items stay pending so a crash re-sends rather than skips them
+            job["pending"] = [list(i) for i in in_flight] + [list(i) for i in queue._queue]
+            _save_job(job)
+            last["checkpoint"] = now
+        if now - last["progress"] >= PROGRESS_EVERY:
+            await _report(app, job)
+            last["progress"] = now
+
+    async def worker():
+        while True:
+            try:
+                item = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            in_flight.add(item)
+            try:
+                ok = await _send_one(app, job, *item)
+            except Exception as e:
+                print("Fan-out error:", e)
+                ok = False
+            in_flight.discard(item)
+            job["sent" if ok else "failed"] += 1
+            await checkpoint()
+
+    await _report(app, job)
+    await asyncio.gather(*(worker() for _ in range(max(1, FANOUT_CONCURRENCY))))
+    await run_io(_clear_job)
+    await _report(app, job, finished=True)
+
+def _spawn(app, job):
+    global _running
+    _running = asyncio.get_running_loop().create_task(_run(app, job))
+    return _running
+
+# Blocking (run_io): the group configured for `type_str` and every user's
+# uploads as [[user_id, name]]
+def _list_job(type_str):
+    group = get_group_target(type_str)
+    if not group:
+        return None, []
+    return group, [[uid, name] for uid in list_user_ids() for name in list_user_txt_files(uid)]
+
+# Queue every user's uploads for sending to the group configured for `type_str`.
+# `app` is anything with a `.bot` (the Application or a handler context).
+# Returns None if a job is already running or no group is set.
+async def start_fanout(app, type_str, admin_chat):
+    if is_running():
+        return None
+    group, pending = await run_io(_list_job, type_str)
+    if not group or is_running():
+        return None
+    job = {
+        "type": type_str, "group": group, "admin_chat": admin_chat,
+        "progress_msg_id": None, "pending": pending,
+        "total": len(pending), "sent": 0, "failed": 0,
+    }
+    _save_job(job)
+    return _spawn(app, job)
+
+# Pick up a job interrupted by a restart (in the process serving its admin)
+def resume_fanout(app):
+    job = load_job()
+    if not job or is_running() or not owns_user(job["admin_chat"]):
+        return None
+    job["progress_msg_id"] = None
+    return _spawn(app, job)
@@ -0,0 +1,126 @@
+import os
+import json
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import IO_THREADS, IO_FLUSH_DELAY
+
+# Filesystem work off the event loop.
+#
+# Bulk operations (saving uploads, walking or deleting user folders) go through
+# run_io(), which runs them on a dedicated thread pool. Small metadata files
+# (ledgers, meta sidecars) are written through write_json_later(): writes to
+# the same path are coalesced for IO_FLUSH_DELAY seconds, then handed as one batch to a
+# single writer thread, so they land in the order they were made. Full writes
+# are atomic (temp file + rename); read_json() sees writes not yet on disk.
+
+_pool = None
+_writer = None
+_lock = threading.Lock()
+_pending = {}    # path -> (obj, indent)
+_in_flight = {}  # path -> serialised bytes handed to the writer but not yet on disk
+_flush_handle = None
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=IO_THREADS, thread_name_prefix="io")
+    return _pool
+
+def _get_writer():
+    global _writer
+    if _writer is None:
+        _writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="io-writer")
+    return _writer
+
+async def run_io(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_get_pool(), fn, *args)
+
+def atomic_write(path, data):
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def read_json(path, default=None):
+    with _lock:
+        queued = _pending.get(path)
+        data = _in_flight.get(path) if queued is None else json.dumps(queued[0])
+    if data is not None:
+        return json.loads(data)
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return default
+
+# ─────────── Batched metadata writes ───────────
+def write_json_later(path, obj, indent=None):
+    with _lock:
+        _pending[path] = (obj, indent)
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        flush_writes([path])  # worker thread or script: write this one through
+        return
+    global _flush_handle
+    if _flush_handle is None:
+        _flush_handle = loop.call_later(IO_FLUSH_DELAY, _flush_soon)
+
+# Take the pending batch (or just `paths` of it); JSON is serialised here, on
+# the caller's thread, so the writer never sees an object the loop is still
+# mutating
+def _take_batch(paths=None):
+    with _lock:
+        batch = []
+        for path in list(_pending) if paths is None else [p for p in paths if p in _pending]:
+            obj, indent = _pending.pop(path)
+            data = json.dumps(obj, indent=indent).encode("utf-8")
+            batch.append((path, data))
+            _in_flight[path] = data
+    return batch
+
+def _write_batch(batch):
+    for path, data in batch:
+        try:
+            atomic_write(path, data)
+        except OSError as e:
+            print("Write error:", path, e)
+        finally:
+            with _lock:
+                if _in_flight.get(path) is data:
+                    del _in_flight[path]
+
+def _flush_soon():
+    global _flush_handle
+    _flush_handle = None
+    batch = _take_batch()
+    if batch:
+        _get_writer().submit(_write_batch, batch)
+
+# Write everything queued so far (or just `paths`) and wait until it is on disk
+def flush_writes(paths=None):
+    batch = _take_batch(paths)
+    _get_writer().submit(_write_batch, batch).result()
+
+# Drop queued writes under `prefix` and wait out any already handed to the
+# writer, so a following delete is not undone by a late write
+def forget_writes(prefix):
+    with _lock:
+        for path in [p for p in _pending if p.startswith(prefix)]:
+            del _pending[path]
+    _get_writer().submit(lambda: None).result()
+
+def shutdown_io():
+    global _pool, _writer, _flush_handle
+    if _flush_handle is not None:
+        _flush_handle.cancel()
+        _flush_handle = None
+    flush_writes()
+    for ex in (_pool, _writer):
+        if ex is not None:
+            ex.shutdown(wait=True)
+    _pool = _writer = None
@@ -0,0 +1,132 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from config import BASE_DIR, GPT_CACHE_MAX_ENTRIES
+
+# On-disk cache of GPT repairs, one small file per raw line keyed by its hash:
+#   BASE_DIR/gpt_cache/ab/abcdef....txt
+# An empty file records an "unrepairable" verdict. File mtime is the LRU clock
+# across restarts; in memory an LRU index of the keys (loaded by one directory
+# scan on first use) picks eviction victims without walking the cache again.
+# Other processes (webhook workers) share the directory, so a key the index
+# lacks is still looked up on disk and adopted if another process stored it.
+# Everything here blocks: call it through core.fileio.run_io.
+
+CACHE_DIR = os.path.join(BASE_DIR, "gpt_cache")
+UNREPAIRABLE = ""
+
+cache_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+_index = None  # key -> None, least recently used first
+_lock = threading.Lock()
+
+def line_key(line):
+    return hashlib.sha1(line.strip().encode("utf-8")).hexdigest()
+
+def _entry_path(key):
+    return os.path.join(CACHE_DIR, key[:2], f"{key}.txt")
+
+def _iter_entries():
+    if not os.path.isdir(CACHE_DIR):
+        return
+    for shard in os.listdir(CACHE_DIR):
+        shard_path = os.path.join(CACHE_DIR, shard)
+        if os.path.isdir(shard_path):
+            for f in os.listdir(shard_path):
+                if f.endswith(".txt"):
+                    yield os.path.join(shard_path, f)
+
+# Caller holds the lock
+def _get_index():
+    global _index
+    if _index is None:
+        entries = []
+        for p in _iter_entries():
+            try:
+                entries.append((os.path.getmtime(p), os.path.basename(p)[:-len(".txt")]))
+            except OSError:
+                pass
+        entries.sort()
+        _index = OrderedDict((key, None) for _, key in entries)
+    return _index
+
+# Returns (True, fixed_line_or_None) on a hit, (False, None) on a miss
+def cache_get(line):
+    key = line_key(line)
+    path = _entry_path(key)
+    with _lock:
+        index = _get_index()
+        if key not in index and not os.path.exists(path):
+            cache_stats["misses"] += 1
+            return False, None
+        index[key] = None
+        index.move_to_end(key)
+    try:
+        with open(path, encoding="utf-8") as f:
+            value = f.read()
+        os.utime(path)  # bump LRU position for the next start
+    except FileNotFoundError:
+        with _lock:
+            _index.pop(key, None)
+            cache_stats["misses"] += 1
+        return False, None
+    with _lock:
+        cache_stats["hits"] += 1
+    return True, (value or None)
+
+# {line: fixed_line_or_None} for the lines that are cached
+def cache_get_many(lines):
+    found = {}
+    for line in lines:
+        hit, value = cache_get(line)
+        if hit:
+            found[line] = value
+    return found
+
+def cache_put(line, fixed):
+    key = line_key(line)
+    path = _entry_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(fixed or UNREPAIRABLE)
+    os.replace(tmp, path)
+    with _lock:
+        index = _get_index()
+        index[key] = None
+        index.move_to_end(key)
+        cache_stats["stores"] += 1
+        full = len(index) > GPT_CACHE_MAX_ENTRIES
+    if full:
+        evict(GPT_CACHE_MAX_ENTRIES)
+
+def cache_put_many(pairs):
+    for line, fixed in pairs:
+        cache_put(line, fixed)
+
+# Drop least recently used entries until the cache is back under 90% of its bound
+def evict(max_entries=GPT_CACHE_MAX_ENTRIES):
+    with _lock:
+        index = _get_index()
+        victims = [index.popitem(last=False)[0]
+                   for _ in range(max(len(index) - int(max_entries * 0.9), 0))]
+    removed = 0
+    for key in victims:
+        try:
+            os.remove(_entry_path(key))
+            removed += 1
+        except OSError:
+            pass
+    with _lock:
+        cache_stats["evictions"] += removed
+    return removed
+
+def get_cache_stats():
+    with _lock:
+        entries = len(_get_index())
+    lookups = cache_stats["hits"] + cache_stats["misses"]
+    return {
+        **cache_stats,
+        "entries": entries,
+        "hit_rate": cache_stats["hits"] / lookups if lookups else 0.0,
+    }
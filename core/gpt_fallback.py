@@ -1,8 +1,18 @@
-
+import re
+import asyncio
 import openai
-from config import OPENAI_API_KEY, GPT_MODEL
+from config import (
+    OPENAI_API_KEY, OPENAI_API_BASE, GPT_MODEL, GPT_BATCH_SIZE,
+    GPT_CONCURRENCY, GPT_RATE_PER_MIN, GPT_MAX_RETRIES
+)
+from core.gpt_cache import cache_get, cache_put, cache_get_many, cache_put_many
+from core.fileio import run_io
+from core.utils import RateLimiter
+from core.metrics import timed, inc
 
 openai.api_key = OPENAI_API_KEY
+if OPENAI_API_BASE:
+    openai.api_base = OPENAI_API_BASE
 
 PROMPT_TEMPLATE = """
 Please convert the following MLBB account line into this exact format:
@@ -15,7 +25,28 @@ Line:
 {}
 """
 
+BATCH_PROMPT_TEMPLATE = """
+Please convert each of the following numbered MLBB account lines into this exact format:
+
+email:password | uid = 123456789 (server_id) | name = NAME | max_rank = RANK | level = 99 | country = XX | is_banned = False | credits = Config by RZX
+
+Answer with exactly one line per input, keeping its number, like "3. <corrected line>".
+If a line cannot be converted, answer "3. NONE". Do not add any comments or explanations.
+
+Lines:
+{}
+"""
+
+NUMBERED_RE = re.compile(r"^\s*(\d+)[.)]\s*(.*)$")
+
+def _looks_fixed(line):
+    return ":" in line and "|" in line
+
+@timed("gpt_fix_line")
 async def fix_line_with_gpt(line: str) -> str | None:
+    hit, cached = await run_io(cache_get, line)
+    if hit:
+        return cached
     try:
         response = await openai.ChatCompletion.acreate(
             model=GPT_MODEL,
@@ -26,7 +57,81 @@ async def fix_line_with_gpt(line: str) -> str | None:
             temperature=0.3
         )
         fixed_line = response.choices[0].message.content.strip()
-        return fixed_line if ":" in fixed_line and "|" in fixed_line else None
+        if not _looks_fixed(fixed_line):
+            return None  # no explicit verdict to cache
+        await run_io(cache_put, line, fixed_line)
+        return fixed_line
     except Exception as e:
         print("GPT error:", e)
         return None
+
+# ─────────── Batched repair ───────────
+# {index: fixed line, or None for an explicit NONE}; lines the model left
+# out, renumbered or answered with something unusable are absent
+def _parse_batch_reply(text, size):
+    answers = {}
+    for row in text.splitlines():
+        m = NUMBERED_RE.match(row)
+        if not m:
+            continue
+        idx, value = int(m.group(1)) - 1, m.group(2).strip()
+        if not 0 <= idx < size:
+            continue
+        if value.upper() == "NONE":
+            answers[idx] = None
+        elif _looks_fixed(value):
+            answers[idx] = value
+    return answers
+
+async def _fix_batch(batch, sem, limiter):
+    numbered = "\n".join(f"{i + 1}. {l.strip()}" for i, l in enumerate(batch))
+    for attempt in range(GPT_MAX_RETRIES + 1):
+        async with sem:
+            await limiter.wait()
+            inc("gpt_requests_total")
+            try:
+                response = await openai.ChatCompletion.acreate(
+                    model=GPT_MODEL,
+                    messages=[
+                        {"role": "system", "content": "You are a data formatting assistant."},
+                        {"role": "user", "content": BATCH_PROMPT_TEMPLATE.format(numbered)}
+                    ],
+                    temperature=0.3
+                )
+                return _parse_batch_reply(response.choices[0].message.content, len(batch))
+            except Exception as e:
+                print(f"GPT batch error (attempt {attempt + 1}):", e)
+        if attempt < GPT_MAX_RETRIES:
+            await asyncio.sleep(min(2 ** attempt, 30))
+    return None  # transient failure, not a verdict
+
+@timed("gpt_fix_lines")
+async def fix_lines_with_gpt(lines, batch_size=GPT_BATCH_SIZE,
+                             concurrency=GPT_CONCURRENCY,
+                             rate_per_min=GPT_RATE_PER_MIN) -> list:
+    """Repair many lines at once; results come back in input order (None = unrepairable)."""
+    lines = list(lines)
+    keys = list(dict.fromkeys(l.strip() for l in lines))
+    known = await run_io(cache_get_many, keys)
+    missing = [k for k in keys if k not in known]
+
+    if missing:
+        sem = asyncio.Semaphore(max(1, concurrency))
+        limiter = RateLimiter(rate_per_min)
+        batches = [missing[i:i + batch_size] for i in range(0, len(missing), batch_size)]
+        results = await asyncio.gather(*(_fix_batch(b, sem, limiter) for b in batches))
+        verdicts = []
+        for batch, answers in zip(batches, results):
+            if answers is None:
+                continue
+            for i, raw in enumerate(batch):
+                # only an explicit verdict is cached; a missing row is retried next time
+                if i not in answers:
+                    inc("gpt_lines_total", outcome="missing")
+                    continue
+                known[raw] = answers[i]
+                verdicts.append((raw, answers[i]))
+                inc("gpt_lines_total", outcome="repaired" if answers[i] else "unrepairable")
+        await run_io(cache_put_many, verdicts)
+
+    return [known.get(l.strip()) for l in lines]
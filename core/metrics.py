@@ -0,0 +1,192 @@
+import sys
+import time
+import asyncio
+import bisect
+import functools
+import threading
+from collections import Counter
+
+# In-process instrumentation: counters, gauges and latency histograms, exposed
+# in Prometheus text format (start_metrics_server) and as a human summary for
+# the admin /stats command. Optionally samples the event loop (start_profiler):
+# loop lag as a histogram, plus a sampling profiler of the loop thread's stack.
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_counters = Counter()
+_gauges = Counter()
+_histograms = {}
+_samples = Counter()
+
+def _key(name, labels):
+    return (name, tuple(sorted(labels.items())))
+
+def inc(name, value=1, **labels):
+    _counters[_key(name, labels)] += value
+
+def gauge_add(name, value, **labels):
+    _gauges[_key(name, labels)] += value
+
+def observe(name, seconds, **labels):
+    key = _key(name, labels)
+    hist = _histograms.get(key)
+    if hist is None:
+        hist = _histograms[key] = {"buckets": [0] * (len(BUCKETS) + 1), "sum": 0.0, "count": 0}
+    hist["buckets"][bisect.bisect_left(BUCKETS, seconds)] += 1
+    hist["sum"] += seconds
+    hist["count"] += 1
+
+# Decorator for sync or async functions: latency histogram, call count by
+# outcome and an in-flight gauge, all under `name`
+def timed(name, **labels):
+    def wrap(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def inner(*args, **kwargs):
+                gauge_add(f"{name}_in_flight", 1, **labels)
+                t0 = time.perf_counter()
+                outcome = "error"
+                try:
+                    result = await fn(*args, **kwargs)
+                    outcome = "ok"
+                    return result
+                finally:
+                    observe(f"{name}_seconds", time.perf_counter() - t0, **labels)
+                    inc(f"{name}_total", outcome=outcome, **labels)
+                    gauge_add(f"{name}_in_flight", -1, **labels)
+        else:
+            @functools.wraps(fn)
+            def inner(*args, **kwargs):
+                gauge_add(f"{name}_in_flight", 1, **labels)
+                t0 = time.perf_counter()
+                outcome = "error"
+                try:
+                    result = fn(*args, **kwargs)
+                    outcome = "ok"
+                    return result
+                finally:
+                    observe(f"{name}_seconds", time.perf_counter() - t0, **labels)
+                    inc(f"{name}_total", outcome=outcome, **labels)
+                    gauge_add(f"{name}_in_flight", -1, **labels)
+        return inner
+    return wrap
+
+def instrument_handler(callback):
+    return timed("handler", handler=callback.__name__)(callback)
+
+# ─────────── Reporting ───────────
+def _fmt_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+def render_prometheus():
+    lines = []
+    for (name, labels), value in sorted(_counters.items()):
+        lines.append(f"rzx_{name}{_fmt_labels(labels)} {value}")
+    for (name, labels), value in sorted(_gauges.items()):
+        lines.append(f"rzx_{name}{_fmt_labels(labels)} {value}")
+    for (name, labels), hist in sorted(_histograms.items()):
+        cumulative = 0
+        for bound, n in zip(BUCKETS + ("+Inf",), hist["buckets"]):
+            cumulative += n
+            lines.append(f"rzx_{name}_bucket{_fmt_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"rzx_{name}_sum{_fmt_labels(labels)} {hist['sum']:.6f}")
+        lines.append(f"rzx_{name}_count{_fmt_labels(labels)} {hist['count']}")
+    return "\n".join(lines) + "\n"
+
+# Bucket upper bound below which fraction `q` of observations fall
+def quantile(hist, q):
+    target = q * hist["count"]
+    seen = 0
+    for bound, n in zip(BUCKETS + (float("inf"),), hist["buckets"]):
+        seen += n
+        if seen >= target and hist["count"]:
+            return bound
+    return 0.0
+
+def histogram(name, **labels):
+    return _histograms.get(_key(name, labels))
+
+def counter(name, **labels):
+    return _counters.get(_key(name, labels), 0)
+
+def summary_text(top=8):
+    lines = ["📊 Handlers (count · p50 · p99):"]
+    for (name, labels), hist in sorted(_histograms.items(), key=lambda kv: -kv[1]["count"]):
+        if name != "handler_seconds":
+            continue
+        lines.append(f"  {dict(labels)['handler']}: {hist['count']} · "
+                     f"≤{quantile(hist, .5)}s · ≤{quantile(hist, .99)}s")
+    lines.append("⚙️ Counters:")
+    for (name, labels), value in sorted(_counters.items()):
+        if name.startswith("handler_"):
+            continue
+        lines.append(f"  {name}{_fmt_labels(labels)}: {value}")
+    busy = [(k, v) for k, v in sorted(_gauges.items()) if v]
+    if busy:
+        lines.append("⏳ In flight:")
+        lines += [f"  {name}{_fmt_labels(labels)}: {v}" for (name, labels), v in busy]
+    if _samples:
+        lines.append("🔥 Loop hot spots:")
+        total = sum(_samples.values())
+        lines += [f"  {n * 100 // total}% {frame}" for frame, n in _samples.most_common(top)]
+    return "\n".join(lines)
+
+# ─────────── Endpoints ───────────
+async def _serve_metrics(reader, writer):
+    try:
+        request = await reader.readline()
+        while (await reader.readline()).strip():
+            pass
+        if request.split()[1:2] == [b"/metrics"]:
+            body, status = render_prometheus().encode(), "200 OK"
+        else:
+            body, status = b"not found\n", "404 Not Found"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except (ConnectionError, IndexError):
+        pass
+    finally:
+        writer.close()
+
+async def start_metrics_server(port, host="127.0.0.1"):
+    return await asyncio.start_server(_serve_metrics, host, port)
+
+# ─────────── Loop profiling ───────────
+async def _watch_loop_lag(interval):
+    while True:
+        t0 = time.perf_counter()
+        await asyncio.sleep(interval)
+        observe("event_loop_lag_seconds", max(time.perf_counter() - t0 - interval, 0.0))
+
+def _sample_thread(thread_id, interval):
+    while True:
+        time.sleep(interval)
+        frame = sys._current_frames().get(thread_id)
+        if frame is None:
+            return
+        # attribute the sample to the innermost frame that is our own code;
+        # samples entirely in the stdlib/libraries are the loop waiting on I/O
+        while frame is not None:
+            name = frame.f_code.co_filename
+            if "site-packages" not in name and "/lib/python" not in name:
+                break
+            frame = frame.f_back
+        if frame is None:
+            _samples["<idle / library>"] += 1
+        else:
+            code = frame.f_code
+            _samples[f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_name}:{frame.f_lineno}"] += 1
+
+def start_profiler(interval_ms=10):
+    loop = asyncio.get_running_loop()
+    loop.create_task(_watch_loop_lag(0.1))
+    threading.Thread(
+        target=_sample_thread, args=(threading.get_ident(), interval_ms / 1000),
+        daemon=True, name="loop-profiler"
+    ).start()
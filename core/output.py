@@ -0,0 +1,100 @@
+import io
+import os
+import gzip
+import shutil
+import zipfile
+import tempfile
+from config import (
+    OUTPUT_SPOOL_MB, OUTPUT_ZIP_MIN_MB, OUTPUT_ZIP_MAX_FILES, OUTPUT_TMP_DIR, OUTPUT_COMPRESS_LEVEL
+)
+
+# Generated documents are built in memory and only spill to a uniquely named,
+# gzip-compressed temp file once they outgrow OUTPUT_SPOOL_MB, so concurrent
+# users never share paths and small results never touch the disk. A finished
+# document is a plain dict so it can travel back from a worker process:
+#   {"name": "cleaned.txt", "data": b"..."}
+#   {"name": ..., "path": "/tmp/...", "size": original bytes}
+
+SPOOL_BYTES = int(OUTPUT_SPOOL_MB * 1024 * 1024)
+
+class OutputBuffer:
+    def __init__(self, name, limit=SPOOL_BYTES):
+        self.name = name
+        self.limit = limit
+        self.size = 0
+        self._buf = io.BytesIO()
+        self._file = None
+        self._path = None
+
+    def _rollover(self):
+        fd, self._path = tempfile.mkstemp(prefix="rzx_", suffix=f"_{self.name}.gz", dir=OUTPUT_TMP_DIR)
+        self._file = gzip.GzipFile(fileobj=os.fdopen(fd, "wb"), mode="wb",
+                                   compresslevel=OUTPUT_COMPRESS_LEVEL)
+        self._file.write(self._buf.getvalue())
+        self._buf = None
+
+    def write(self, text):
+        data = text.encode("utf-8") if isinstance(text, str) else text
+        if self._file is None and self.size + len(data) > self.limit:
+            self._rollover()
+        (self._file or self._buf).write(data)
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+
+    def finish(self):
+        if self._file is None:
+            return {"name": self.name, "data": self._buf.getvalue()}
+        fileobj = self._file.fileobj
+        self._file.close()
+        fileobj.close()
+        return {"name": self.name, "path": self._path, "size": self.size}
+
+def output_size(out):
+    return len(out["data"]) if "data" in out else out["size"]
+
+def open_output(out):
+    return io.BytesIO(out["data"]) if "data" in out else gzip.open(out["path"], "rb")
+
+# The document's contents; a spilled one is decompressed, so call that through
+# core.fileio.run_io
+def read_output(out):
+    if "data" in out:
+        return out["data"]
+    with gzip.open(out["path"], "rb") as f:
+        return f.read()
+
+def discard_output(out):
+    if "path" in out and os.path.exists(out["path"]):
+        os.remove(out["path"])
+
+# Give documents that share a name a numeric suffix ("a.txt", "a-2.txt"), in order
+def unique_names(outputs):
+    used = set()
+    for out in outputs:
+        stem, ext = os.path.splitext(out["name"])
+        name, n = out["name"], 2
+        while name in used:
+            name, n = f"{stem}-{n}{ext}", n + 1
+        used.add(name)
+        out["name"] = name
+    return outputs
+
+# Pack several documents into one zip document when together they are large,
+# or too many to send one by one without running into flood limits
+def maybe_zip(outputs, name):
+    total = sum(output_size(o) for o in outputs)
+    if len(outputs) < 2 or OUTPUT_ZIP_MIN_MB < 0 or (
+        total < OUTPUT_ZIP_MIN_MB * 1024 * 1024 and len(outputs) <= OUTPUT_ZIP_MAX_FILES
+    ):
+        return outputs
+    archive = OutputBuffer(name)
+    with zipfile.ZipFile(archive, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for out in outputs:
+            with open_output(out) as src, zf.open(out["name"], "w") as dst:
+                shutil.copyfileobj(src, dst)
+            discard_output(out)
+    return [archive.finish()]
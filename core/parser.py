@@ -1,4 +1,5 @@
 import re
+import bisect
 from core.utils import now_str
 
 LEVEL_RANGES = {
@@ -8,10 +9,60 @@ LEVEL_RANGES = {
     "100+": range(100, 9999)
 }
 
+# Exact shape written by build_output_line; anything else takes the loose path.
+# Fields that the loose parser would split on (" | ", " = ", ":", and "(" or
+# ")" inside the uid) are excluded, so both paths agree on every line the
+# fast path accepts. It is not much faster than splitting: on the bundled
+# benchmarks (benchmarks/bench_parser.py) parse_lines is within about 10% of
+# the loose parser on valid and mixed input and slightly slower on malformed
+# lines, which pay for the failed match before falling back.
+CANONICAL_RE = re.compile(
+    r"([^:|]*):([^:|]*) \| uid = ([^\s()]+) \(([^()]*)\)"
+    r" \| name = ([^|=]*) \| max_rank = ([^|=]*) \| level = (-?\d+)"
+    r" \| country = ([^|=]*) \| is_banned = (True|False|true|false)"
+    r"(?: \| credits = ([^|=]*))?"
+)
+
 # Parse line into structured account dict
 def parse_line(line: str):
+    m = CANONICAL_RE.fullmatch(line.strip())
+    if m is None:
+        return _parse_line_loose(line)
+    return _from_match(m)
+
+# Batch entry point: one result (account or None) per input line
+def parse_lines(lines):
+    fullmatch = CANONICAL_RE.fullmatch
+    loose = _parse_line_loose
+    out = []
+    append = out.append
+    for line in lines:
+        m = fullmatch(line.strip())
+        append(loose(line) if m is None else _from_match(m))
+    return out
+
+# Account dict from a CANONICAL_RE match
+def _from_match(m):
+    email, password, uid, server_id, name, rank, level, country, banned, credits = m.groups()
+    return {
+        "email": email,
+        "password": password,
+        "uid": uid,
+        "server_id": server_id,
+        "name": name,
+        "rank": rank,
+        "level": int(level),
+        "country": country,
+        "banned": banned[0] in "Tt",
+        "credits": credits if credits is not None else "Config by RZX"
+    }
+
+# Tolerant field-by-field parser for odd variants of the format
+def _parse_line_loose(line: str):
+    parts = line.strip().split(" | ")
+    if len(parts) < 7 or ":" not in parts[0]:
+        return None
     try:
-        parts = line.strip().split(" | ")
         creds = parts[0].split(":")
         uid_full = parts[1].split(" = ")[1]
         uid = uid_full.split(" ")[0]
@@ -28,7 +79,7 @@ def parse_line(line: str):
             "banned": parts[6].split(" = ")[1].lower() == "true",
             "credits": parts[7].split(" = ")[1] if len(parts) > 7 else "Config by RZX"
         }
-    except:
+    except (IndexError, ValueError):
         return None
 
 # Clean, formatted preview for each account (as in your viewer)
@@ -53,12 +104,21 @@ def build_output_line(acc):
         f" | country = {acc['country']} | is_banned = {acc['banned']} | credits = {acc['credits']}"
     )
 
+# LEVEL_RANGES as sorted boundaries, so bucket lookup is a single bisect
+_LEVEL_KEYS = sorted(LEVEL_RANGES, key=lambda k: LEVEL_RANGES[k].start)
+_LEVEL_STARTS = [LEVEL_RANGES[k].start for k in _LEVEL_KEYS]
+
+def level_bucket(level):
+    i = bisect.bisect_right(_LEVEL_STARTS, level) - 1
+    if i < 0 or level not in LEVEL_RANGES[_LEVEL_KEYS[i]]:
+        return None
+    return _LEVEL_KEYS[i]
+
 # Separate a list of accounts by level range
 def separate_by_level(accounts):
     result = {k: [] for k in LEVEL_RANGES}
     for acc in accounts:
-        for level_key, level_range in LEVEL_RANGES.items():
-            if acc["level"] in level_range:
-                result[level_key].append(acc)
-                break
+        level_key = level_bucket(acc["level"])
+        if level_key:
+            result[level_key].append(acc)
     return result
@@ -0,0 +1,49 @@
+import re
+from config import SEPARATE_RULES
+from core.parser import level_bucket, LEVEL_RANGES
+
+# Single-pass partitioning of accounts by any combination of dimensions.
+# A rule is a tuple of dimension names; every account maps to one bucket key
+# (one value per dimension) and all buckets are filled in the same scan.
+
+DIMENSIONS = {
+    "level": lambda acc: level_bucket(acc["level"]),
+    "rank": lambda acc: acc["rank"].strip() or "Unknown",
+    "country": lambda acc: acc["country"].strip().upper() or "Unknown",
+    "banned": lambda acc: "Banned" if acc["banned"] else "NotBanned",
+}
+
+_LEVEL_ORDER = {k: i for i, k in enumerate(LEVEL_RANGES)}
+
+def parse_rule(text):
+    dims = tuple(d.strip().lower() for d in text.split(",") if d.strip())
+    unknown = [d for d in dims if d not in DIMENSIONS]
+    if not dims or unknown:
+        raise ValueError(f"Unknown separation dimension(s): {', '.join(unknown) or text!r}")
+    return dims
+
+def load_rules(text=SEPARATE_RULES):
+    return [parse_rule(r) for r in text.split(";") if r.strip()]
+
+def rule_label(rule):
+    return " + ".join(d.capitalize() for d in rule)
+
+def bucket_key(acc, rule):
+    key = tuple(DIMENSIONS[d](acc) for d in rule)
+    return None if None in key else key
+
+def bucket_name(key):
+    return "_".join(re.sub(r"[^\w+-]+", "-", str(part)) for part in key)
+
+# Stable output order: level buckets in LEVEL_RANGES order, the rest alphabetical
+def bucket_sort_key(rule, key):
+    return tuple(
+        (_LEVEL_ORDER.get(part, len(_LEVEL_ORDER)), "") if dim == "level" else (0, part)
+        for dim, part in zip(rule, key)
+    )
+
+def partition(accounts, rule):
+    for acc in accounts:
+        key = bucket_key(acc, rule)
+        if key is not None:
+            yield key, acc
@@ -0,0 +1,59 @@
+import os
+from core.parser import clean_format_block, build_output_line
+from core.store import AccountStore, store_path
+from core.output import OutputBuffer, SPOOL_BYTES, discard_output, maybe_zip, unique_names
+from core.partition import partition, bucket_name, bucket_sort_key
+
+# Output rendering jobs. They run inside worker processes (core.workers), read
+# the upload's store directly and return finished documents (core.output).
+
+def _stem(upload_path):
+    return os.path.splitext(os.path.basename(upload_path))[0]
+
+def render_clean(upload_path):
+    store = AccountStore(store_path(upload_path))
+    out = OutputBuffer(f"{_stem(upload_path)}_cleaned.txt")
+    try:
+        for n, acc in enumerate(store):
+            out.write(("\n\n" if n else "") + clean_format_block(acc))
+    finally:
+        store.close()
+    return out.finish()
+
+# One document per non-empty bucket of `rule` (see core.partition), written in
+# a single scan, or a single zip of all of them when there are many or they
+# are large
+def render_partition(upload_path, rule, clean):
+    store = AccountStore(store_path(upload_path))
+    fmt = clean_format_block if clean else build_output_line
+    limit = SPOOL_BYTES // 8  # many buckets may be open at once
+    outs = {}
+    try:
+        for key, acc in partition(store, rule):
+            buf = outs.get(key)
+            if buf is None:
+                buf = outs[key] = OutputBuffer(f"{bucket_name(key)}.txt", limit)
+            buf.write(fmt(acc) + "\n\n")
+    except BaseException:
+        for buf in outs.values():
+            discard_output(buf.finish())
+        raise
+    finally:
+        store.close()
+    # different buckets can sanitise to the same file name ("Legend/X", "Legend X")
+    docs = unique_names([outs[k].finish() for k in sorted(outs, key=lambda k: bucket_sort_key(rule, k))])
+    return maybe_zip(docs, f"{_stem(upload_path)}_separated.zip")
+
+# Matching accounts from a /find query: [(upload_path, store build, [record ids]), ...]
+def render_hits(hits, name="find_results.txt"):
+    out = OutputBuffer(name)
+    for upload_path, build, ids in hits:
+        store = AccountStore(store_path(upload_path))
+        try:
+            if store.build != build:
+                continue
+            for i in ids:
+                out.write(build_output_line(store[i]) + "\n")
+        finally:
+            store.close()
+    return out.finish()
@@ -0,0 +1,54 @@
+import heapq
+import threading
+
+# Expiry index for upload retention.
+#
+# A min-heap of (opened_at, user_id, name), fed whenever an upload is saved or
+# opened, so the oldest candidates are always on top and a sweep only looks at
+# uploads that are actually due. Re-opening a file pushes a new entry instead
+# of updating the old one; callers check popped entries against the ledger
+# and skip the stale ones. The heap is rebuilt from the ledgers at startup,
+# so it needs no file of its own.
+
+_heap = []
+_live = {}  # (user_id, name) -> latest opened_at
+_lock = threading.Lock()
+
+def track(user_id, name, opened_at):
+    with _lock:
+        _live[(user_id, name)] = opened_at
+        heapq.heappush(_heap, (opened_at, user_id, name))
+        if len(_heap) > 2 * len(_live) + 1000:
+            _compact()
+
+def untrack(user_id, name):
+    with _lock:
+        _live.pop((user_id, name), None)
+
+def untrack_user(user_id):
+    with _lock:
+        for key in [k for k in _live if k[0] == user_id]:
+            del _live[key]
+
+# Drop stale entries (caller holds the lock)
+def _compact():
+    _heap[:] = [(t, u, n) for (u, n), t in _live.items()]
+    heapq.heapify(_heap)
+
+# Pop up to `limit` entries opened before `cutoff`; stale ones are dropped
+# here and still count against the limit, so one call is bounded work.
+# Returns [(user_id, name, opened_at)] for the live ones, oldest first.
+def pop_due(cutoff, limit):
+    due = []
+    with _lock:
+        while _heap and _heap[0][0] < cutoff and limit > 0:
+            opened_at, user_id, name = heapq.heappop(_heap)
+            limit -= 1
+            if _live.get((user_id, name)) == opened_at:
+                del _live[(user_id, name)]
+                due.append((user_id, name, opened_at))
+    return due
+
+def pending():
+    with _lock:
+        return len(_live)
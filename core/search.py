@@ -0,0 +1,150 @@
+import os
+import re
+import shlex
+import pickle
+import bisect
+from array import array
+from core.store import AccountStore, store_path, open_store
+
+# Secondary indexes over an upload's store, kept next to it as `<file>.idx`.
+#
+# Per record there are small forward columns (level, banned, country code,
+# rank code); country and rank also have posting lists of record ids, and
+# level has a (level, id) list sorted by level for range queries. A query
+# starts from its most selective condition and checks the rest against the
+# forward columns, so nothing is decoded except the matches.
+
+INDEX_VERSION = 2
+FIELDS = ("country", "rank", "level", "banned")
+COND_RE = re.compile(r"^(\w+)\s*(>=|<=|!=|=|>|<)\s*(.+)$")
+
+_cache = {}
+
+def index_path(upload_path):
+    return f"{upload_path}.idx"
+
+# Worker-process job: build and write the index for an upload's store
+def build_index(upload_path):
+    store = AccountStore(store_path(upload_path))
+    try:
+        idx = {
+            "version": INDEX_VERSION, "build": store.build, "count": len(store),
+            "level": array("i"), "banned": array("b"),
+            "country": array("H"), "rank": array("H"),
+            "country_values": [], "rank_values": [],
+        }
+        codes = {"country": {}, "rank": {}}
+        posts = {"country": [], "rank": []}
+        for i, acc in enumerate(store):
+            idx["level"].append(acc["level"])
+            idx["banned"].append(1 if acc["banned"] else 0)
+            for field in ("country", "rank"):
+                value = acc[field].strip().upper()
+                code = codes[field].get(value)
+                if code is None:
+                    code = codes[field][value] = len(idx[f"{field}_values"])
+                    idx[f"{field}_values"].append(value)
+                    posts[field].append(array("I"))
+                idx[field].append(code)
+                posts[field][code].append(i)
+        idx["country_post"], idx["rank_post"] = posts["country"], posts["rank"]
+        order = sorted(range(len(store)), key=idx["level"].__getitem__)
+        idx["level_ids"] = array("I", order)
+        idx["level_sorted"] = array("i", (idx["level"][i] for i in order))
+    finally:
+        store.close()
+    tmp = f"{index_path(upload_path)}.tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(idx, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, index_path(upload_path))
+    return idx["count"]
+
+# Load the index if it was built from the current store, else None (needs
+# build_index). Blocking: run it through run_io.
+def load_index(upload_path):
+    store = open_store(upload_path)
+    if store is None:
+        return None
+    build = store.build
+    store.close()
+    cached = _cache.get(upload_path)
+    if cached and cached["build"] == build:
+        return cached
+    try:
+        with open(index_path(upload_path), "rb") as f:
+            idx = pickle.load(f)
+    except (FileNotFoundError, pickle.UnpicklingError, EOFError):
+        return None
+    if idx.get("version") != INDEX_VERSION or idx["build"] != build:
+        return None
+    _cache[upload_path] = idx
+    return idx
+
+# "country=PH level>=80 banned=false" -> [("country", "=", "PH"), ...]
+def parse_query(text):
+    conds = []
+    for token in shlex.split(text):
+        m = COND_RE.match(token)
+        if not m:
+            raise ValueError(f"Can't understand {token!r}")
+        field, op, value = m.group(1).lower(), m.group(2), m.group(3).strip()
+        if field not in FIELDS:
+            raise ValueError(f"Unknown field {field!r} (use {', '.join(FIELDS)})")
+        if field == "level":
+            if not value.lstrip("-").isdigit():
+                raise ValueError(f"Level must be a number, got {value!r}")
+            value = int(value)
+        elif op not in ("=", "!="):
+            raise ValueError(f"{field} only supports = and !=")
+        elif field == "banned":
+            if value.lower() not in ("true", "false", "yes", "no"):
+                raise ValueError("banned must be true or false")
+            value = value.lower() in ("true", "yes")
+        else:
+            value = value.upper()
+        conds.append((field, op, value))
+    if not conds:
+        raise ValueError("Empty query")
+    return conds
+
+def _level_range(op, value):
+    return {
+        "=": (value, value), ">=": (value, None), ">": (value + 1, None),
+        "<=": (None, value), "<": (None, value - 1),
+    }.get(op)
+
+def _candidates(idx, cond):
+    field, op, value = cond
+    if field in ("country", "rank") and op == "=":
+        values = idx[f"{field}_values"]
+        return idx[f"{field}_post"][values.index(value)] if value in values else array("I")
+    if field == "level" and op != "!=":
+        lo, hi = _level_range(op, value)
+        levels = idx["level_sorted"]
+        a = 0 if lo is None else bisect.bisect_left(levels, lo)
+        b = len(levels) if hi is None else bisect.bisect_right(levels, hi)
+        return sorted(idx["level_ids"][a:b])
+    return None
+
+def _matches(idx, i, cond):
+    field, op, value = cond
+    if field == "level":
+        level = idx["level"][i]
+        return {"=": level == value, "!=": level != value, ">=": level >= value,
+                ">": level > value, "<=": level <= value, "<": level < value}[op]
+    if field == "banned":
+        hit = bool(idx["banned"][i]) == value
+    else:
+        hit = idx[f"{field}_values"][idx[field][i]] == value
+    return hit if op == "=" else not hit
+
+# Record ids in one upload matching every condition, in file order
+def run_query(idx, conds):
+    driver, best = None, None
+    for cond in conds:
+        cand = _candidates(idx, cond)
+        if cand is not None and (best is None or len(cand) < len(best)):
+            driver, best = cond, cand
+    ids = best if best is not None else range(idx["count"])
+    rest = [c for c in conds if c is not driver]
+    return [i for i in ids if all(_matches(idx, i, c) for c in rest)]
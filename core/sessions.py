@@ -0,0 +1,147 @@
+import os
+import time
+from config import SESSION_IDLE_TTL
+from core.store import load_store
+from core.viewer import format_account_message, get_labels
+from core.fileio import run_io
+from core import state
+
+# Review sessions hold only a cursor and a file reference per user. Accounts
+# are paged from the upload's store on demand, and (file, cursor) is persisted
+# in the shared state database, so a restarted bot, or another worker process,
+# can pick the session back up. Labels shown with each account are read from
+# the database on the I/O pool, a whole prefetch window in one query.
+
+PREFETCH = 3  # accounts pre-rendered on each side of the cursor
+
+_sessions = {}
+_stores = {}
+
+class ReviewSession:
+    def __init__(self, user_id, path, store, i=0):
+        self.user_id = user_id
+        self.path = path
+        self.store = store
+        self.i = min(i, max(len(store) - 1, 0))
+        self.last_seen = time.monotonic()
+        self.dirty = False
+        self._rendered = {}
+        self._epoch = 0  # bumped by invalidate(), so a render in flight is not kept
+
+    @property
+    def session_id(self):
+        return os.path.basename(self.path)
+
+    @property
+    def total(self):
+        return len(self.store)
+
+    def current(self):
+        return self.store[self.i]
+
+    def move(self, delta):
+        i = min(max(self.i + delta, 0), self.total - 1)
+        moved = i != self.i
+        if moved:
+            self.i = i
+            self.dirty = True
+        self.touch()
+        return moved
+
+    # Viewer text for account i, served from the pre-rendered window when possible
+    async def render(self, i=None):
+        i = self.i if i is None else i
+        text = self._rendered.get(i)
+        if text is None:
+            text = (await self._render_many([i]))[i]
+        return text
+
+    # {i: text} for accounts `indices`, their labels read in one query
+    async def _render_many(self, indices):
+        epoch = self._epoch
+        accs = {i: self.store[i] for i in indices}
+        labels = await run_io(get_labels, self.user_id, self.session_id,
+                              [acc["uid"] for acc in accs.values()])
+        texts = {i: format_account_message(acc, i, self.total, label=labels.get(acc["uid"]))
+                 for i, acc in accs.items()}
+        if epoch == self._epoch:
+            self._rendered.update(texts)
+        return texts
+
+    def invalidate(self, i=None):
+        self._epoch += 1
+        self._rendered.pop(self.i if i is None else i, None)
+
+    # Render the neighbours of the cursor ahead of the next click and drop
+    # anything that fell out of the window
+    async def prefetch(self):
+        lo, hi = max(self.i - PREFETCH, 0), min(self.i + PREFETCH, self.total - 1)
+        for i in [k for k in self._rendered if k < lo or k > hi]:
+            del self._rendered[i]
+        missing = [i for i in range(lo, hi + 1) if i not in self._rendered]
+        if missing:
+            await self._render_many(missing)
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+    def flush(self):
+        if not self.dirty:
+            return
+        state.save_cursor(self.user_id, self.path, self.i)
+        self.dirty = False
+
+async def _get_store(path, user_id):
+    store = _stores.get(path)
+    if store is None:
+        store = await load_store(path, user_id)
+        if store is not None:
+            _stores[path] = store
+    return store
+
+def _release_store(path):
+    if any(s.path == path for s in _sessions.values()):
+        return
+    store = _stores.pop(path, None)
+    if store is not None:
+        store.close()
+
+# Start (or resume) reviewing `path`; returns None if it has no accounts
+async def open_session(user_id, path):
+    old = _sessions.pop(user_id, None)
+    if old:
+        old.flush()
+        _release_store(old.path)
+    store = await _get_store(path, user_id)
+    if not store:
+        return None
+    line = await run_io(state.get_cursor, user_id, path)
+    sess = ReviewSession(user_id, path, store, line)
+    _sessions[user_id] = sess
+    await run_io(state.save_cursor, user_id, path, sess.i)  # now the current file
+    return sess
+
+# Active session for a user, restored from disk after a restart or expiry
+async def get_session(user_id):
+    sess = _sessions.get(user_id)
+    if sess:
+        sess.touch()
+        return sess
+    path = await run_io(state.current_path, user_id)
+    if not path or not os.path.exists(path):
+        return None
+    return await open_session(user_id, path)
+
+def flush_sessions():
+    for sess in list(_sessions.values()):
+        sess.flush()
+
+# Flush and drop sessions idle for longer than the TTL
+def expire_sessions(ttl=SESSION_IDLE_TTL):
+    cutoff = time.monotonic() - ttl
+    expired = [uid for uid, s in _sessions.items() if s.last_seen < cutoff]
+    for uid in expired:
+        sess = _sessions.pop(uid)
+        sess.flush()
+        _release_store(sess.path)
+    return len(expired)
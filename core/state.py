@@ -0,0 +1,151 @@
+import os
+import time
+import sqlite3
+import threading
+from config import STATE_DB
+
+# State shared by every bot process, in one SQLite database (STATE_DB).
+#
+# WAL mode lets any number of processes read while one writes, and a commit
+# is visible to every other connection straight away, so a webhook worker
+# (core.webhook) can serve any user: review cursors, labels, daily limits and
+# admin group targets all live here rather than in process memory. Each
+# thread gets its own connection. Statements autocommit; the few
+# read-modify-write steps take the write lock up front (BEGIN IMMEDIATE).
+#
+# Per-user work that is still cached in memory (usage ledgers, retention,
+# open review sessions) belongs to the process that owns the user: with
+# WEBHOOK_WORKERS processes, user u is always served by worker u % count.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cursors (
+    user_id INTEGER NOT NULL, path TEXT NOT NULL,
+    line INTEGER NOT NULL, updated_at REAL NOT NULL,
+    PRIMARY KEY (user_id, path)
+);
+CREATE TABLE IF NOT EXISTS labels (
+    user_id INTEGER NOT NULL, session_id TEXT NOT NULL, uid TEXT NOT NULL,
+    label TEXT NOT NULL, line TEXT NOT NULL,
+    UNIQUE (user_id, session_id, uid)
+);
+CREATE TABLE IF NOT EXISTS daily_usage (
+    user_id INTEGER NOT NULL, action TEXT NOT NULL, at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS daily_usage_user ON daily_usage (user_id, action, at);
+CREATE TABLE IF NOT EXISTS targets (label TEXT PRIMARY KEY, chat_id INTEGER NOT NULL);
+"""
+
+_local = threading.local()
+_worker = {"index": 0, "count": 1}
+
+def set_worker(index, count):
+    _worker["index"], _worker["count"] = index, max(1, count)
+
+def worker_index():
+    return _worker["index"]
+
+def owns_user(user_id):
+    return int(user_id) % _worker["count"] == _worker["index"]
+
+def db():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(STATE_DB) or ".", exist_ok=True)
+        conn = sqlite3.connect(STATE_DB, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        _local.conn = conn
+    return conn
+
+# ─────────── Review cursors ───────────
+# One saved position per (user, file); the most recently saved one is the
+# file the user is currently reviewing
+def get_cursor(user_id, path):
+    row = db().execute("SELECT line FROM cursors WHERE user_id = ? AND path = ?",
+                       (user_id, path)).fetchone()
+    return row[0] if row else 0
+
+def save_cursor(user_id, path, line):
+    db().execute(
+        "INSERT INTO cursors (user_id, path, line, updated_at) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT (user_id, path) DO UPDATE SET line = excluded.line, "
+        "updated_at = excluded.updated_at",
+        (user_id, path, line, time.time())
+    )
+
+def current_path(user_id):
+    row = db().execute("SELECT path FROM cursors WHERE user_id = ? ORDER BY updated_at DESC LIMIT 1",
+                       (user_id,)).fetchone()
+    return row[0] if row else None
+
+# ─────────── Labels ───────────
+# {uid: label} for those of `uids` that are labelled
+def get_labels(user_id, session_id, uids):
+    uids = list(uids)
+    return dict(db().execute(
+        f"SELECT uid, label FROM labels WHERE user_id = ? AND session_id = ? "
+        f"AND uid IN ({','.join('?' * len(uids))})",
+        (user_id, session_id, *uids)
+    ).fetchall())
+
+# `rows` is [(uid, label, line)]; later rows win
+def set_labels(user_id, session_id, rows):
+    db().executemany(
+        "INSERT INTO labels (user_id, session_id, uid, label, line) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT (user_id, session_id, uid) DO UPDATE SET label = excluded.label, line = excluded.line",
+        [(user_id, session_id, uid, label, line) for uid, label, line in rows]
+    )
+
+# [(label, line)] in the order accounts were first labelled
+def list_labels(user_id, session_id):
+    return db().execute(
+        "SELECT label, line FROM labels WHERE user_id = ? AND session_id = ? ORDER BY rowid",
+        (user_id, session_id)
+    ).fetchall()
+
+# ─────────── Daily limits ───────────
+# Use up one of `limit` allowances for `action` in a rolling window; returns
+# False (and records nothing) if they are all used
+def take_daily(user_id, action, limit, window=86400):
+    conn = db()
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("DELETE FROM daily_usage WHERE user_id = ? AND action = ? AND at < ?",
+                     (user_id, action, now - window))
+        (used,) = conn.execute("SELECT COUNT(*) FROM daily_usage WHERE user_id = ? AND action = ?",
+                               (user_id, action)).fetchone()
+        ok = used < limit
+        if ok:
+            conn.execute("INSERT INTO daily_usage (user_id, action, at) VALUES (?, ?, ?)",
+                         (user_id, action, now))
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return ok
+
+# Give back the most recent allowance, for an action that failed after take_daily()
+def refund_daily(user_id, action):
+    db().execute(
+        "DELETE FROM daily_usage WHERE rowid = (SELECT MAX(rowid) FROM daily_usage "
+        "WHERE user_id = ? AND action = ?)", (user_id, action)
+    )
+
+# ─────────── Admin targets ───────────
+def get_targets():
+    return dict(db().execute("SELECT label, chat_id FROM targets").fetchall())
+
+def set_target(label, chat_id):
+    db().execute(
+        "INSERT INTO targets (label, chat_id) VALUES (?, ?) "
+        "ON CONFLICT (label) DO UPDATE SET chat_id = excluded.chat_id",
+        (label, chat_id)
+    )
+
+# Deleting data does not reset daily limits, so daily_usage is kept
+def clear_user(user_id):
+    conn = db()
+    for table in ("cursors", "labels"):
+        conn.execute(f"DELETE FROM {table} WHERE user_id = ?", (user_id,))
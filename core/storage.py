@@ -1,8 +1,15 @@
 import os
-import json
 import time
-from config import BASE_DIR, MAX_FILE_SIZE_MB
+import shutil
+import threading
+from config import BASE_DIR, MAX_FILE_SIZE_MB, INACTIVE_DAYS, RETENTION_SWEEP_FILES
 from core.utils import now_str
+from core.compress import compress_file, scan
+from config import UPLOAD_COMPRESS_LEVEL
+from core.store import start_store_build
+from core.dedup import forget_upload, forget_user
+from core import retention, state
+from core.fileio import run_io, read_json, write_json_later, forget_writes
 
 def get_user_dir(user_id):
     path = os.path.join(BASE_DIR, str(user_id))
@@ -19,23 +26,223 @@ def get_generated_dir(user_id):
     os.makedirs(path, exist_ok=True)
     return path
 
+# ─────────── Usage ledger ───────────
+# Per-user `usage.json` tracking every upload's size and last-opened time:
+#   {"total": bytes, "files": {name: {"size": n, "raw_size": n, "lines": n,
+#                                     "uploaded_at": ts, "opened_at": ts}}}
+# `size` is what the upload takes on disk (compressed, see core.compress) and
+# is what quotas count; `raw_size` is the original text size.
+# Kept in memory once loaded; changes are batched to disk through core.fileio,
+# so quota checks and retention never need to walk the upload tree. Every
+# upload's opened_at is also fed to the expiry index (core.retention).
+# Only the process that owns a user (core.state.owns_user) caches, changes and
+# expires their ledger; other processes read it fresh from disk. Ledgers change
+# both on the loop (uploads, opens) and on the I/O pool (retention sweeps,
+# reconciling, /deletedata), so every change holds _ledger_lock.
+
+SIDECAR_SUFFIXES = (".meta.json", ".store", ".idx", ".keys", ".part", ".tmp")
+
+_ledgers = {}
+_ledger_lock = threading.RLock()
+
+def _ledger_path(user_id):
+    return os.path.join(get_user_dir(user_id), "usage.json")
+
+# Caller holds the lock; the writer gets a copy, never a ledger still changing
+def _save_ledger(user_id):
+    ledger = _ledgers[user_id]
+    write_json_later(_ledger_path(user_id), {
+        "total": ledger["total"],
+        "files": {name: dict(entry) for name, entry in ledger["files"].items()},
+    })
+
+def _get_ledger(user_id):
+    ledger = _ledgers.get(user_id)
+    if ledger is None and not state.owns_user(user_id):
+        return read_json(_ledger_path(user_id)) or {"total": 0, "files": {}}
+    if ledger is None:
+        ledger = read_json(_ledger_path(user_id))
+        if ledger is None:
+            return reconcile_ledger(user_id)
+        with _ledger_lock:
+            if user_id in _ledgers:  # loaded by another thread meanwhile
+                return _ledgers[user_id]
+            _ledgers[user_id] = ledger
+            _track_files(user_id, ledger)
+    return ledger
+
+def _track_files(user_id, ledger):
+    for name, entry in ledger["files"].items():
+        retention.track(user_id, name, entry["opened_at"])
+
+# Load every user's ledger on the I/O pool so handlers find them in memory
+async def preload_ledgers():
+    await run_io(lambda: [_get_ledger(user_id) for user_id in list_user_ids()
+                          if state.owns_user(user_id)])
+
+def _is_upload_name(name):
+    return is_txt_file(name) and not name.endswith(SIDECAR_SUFFIXES)
+
+# Rebuild a user's ledger from what is actually on disk, keeping known timestamps.
+# The disk is scanned without the lock; uploads saved, opened or deleted in the
+# meantime are taken from the live ledger when the result is applied.
+def reconcile_ledger(user_id):
+    with _ledger_lock:
+        before = dict((_ledgers.get(user_id) or {"files": {}})["files"])
+    upload_dir = get_uploaded_dir(user_id)
+    files = {}
+    for name in os.listdir(upload_dir):
+        path = os.path.join(upload_dir, name)
+        if not _is_upload_name(name) or not os.path.isfile(path):
+            continue
+        entry = dict(before.get(name) or {})
+        size = os.path.getsize(path)
+        if entry.get("size") != size or "lines" not in entry or "raw_size" not in entry:
+            entry["raw_size"], entry["lines"] = scan(path)
+        entry["size"] = size
+        entry.setdefault("uploaded_at", os.path.getmtime(path))
+        entry.setdefault("opened_at", entry["uploaded_at"])
+        files[name] = entry
+    with _ledger_lock:
+        current = (_ledgers.get(user_id) or {"files": {}})["files"]
+        for name, entry in current.items():
+            if entry is not before.get(name):
+                files[name] = entry
+            elif name in files:
+                files[name]["opened_at"] = entry["opened_at"]
+        for name in before.keys() - current.keys():
+            files.pop(name, None)
+        ledger = _ledgers[user_id] = {"total": sum(e["size"] for e in files.values()), "files": files}
+        _track_files(user_id, ledger)
+        _save_ledger(user_id)
+    return ledger
+
+def reconcile_all_ledgers():
+    for user_id in list_user_ids():
+        if state.owns_user(user_id):
+            reconcile_ledger(user_id)
+
+def list_user_ids():
+    if not os.path.isdir(BASE_DIR):
+        return []
+    return [int(d) for d in os.listdir(BASE_DIR) if d.isdigit()]
+
+def get_file_info(user_id, file_name):
+    return _get_ledger(user_id)["files"].get(file_name)
+
 def get_total_upload_size(user_id):
-    path = get_uploaded_dir(user_id)
-    total = 0
-    for root, _, files in os.walk(path):
-        for f in files:
-            total += os.path.getsize(os.path.join(root, f))
-    return total / (1024 * 1024)  # MB
+    return _get_ledger(user_id)["total"] / (1024 * 1024)  # MB
+
+def list_user_txt_files(user_id):
+    with _ledger_lock:
+        return sorted(_get_ledger(user_id)["files"])
+
+def mark_file_opened(user_id, file_name):
+    with _ledger_lock:
+        entry = get_file_info(user_id, file_name)
+        if entry:
+            entry["opened_at"] = time.time()
+            retention.track(user_id, file_name, entry["opened_at"])
+            _save_ledger(user_id)
+
+def delete_upload(user_id, file_name):
+    with _ledger_lock:
+        ledger = _get_ledger(user_id)
+        path = get_upload_path(user_id, file_name)
+        forget_writes(path + ".")  # its sidecars
+        for p in [path] + [path + suffix for suffix in SIDECAR_SUFFIXES]:
+            if os.path.exists(p):
+                os.remove(p)
+        forget_upload(user_id, file_name)
+        entry = ledger["files"].pop(file_name, None)
+        retention.untrack(user_id, file_name)
+        if entry:
+            ledger["total"] -= entry["size"]
+            _save_ledger(user_id)
+    return entry["size"] if entry else 0
+
+# One retention step: delete uploads nobody has opened for `days`, oldest
+# first, looking at no more than `limit` expiry-index entries. Returns what
+# was reclaimed: {"files": n, "bytes": n}. Blocking: run it through run_io.
+def sweep_inactive(days=INACTIVE_DAYS, limit=RETENTION_SWEEP_FILES):
+    reclaimed = {"files": 0, "bytes": 0}
+    for user_id, name, opened_at in retention.pop_due(time.time() - days * 86400, limit):
+        with _ledger_lock:  # not reopened between the check and the delete
+            ledger = _ledgers.get(user_id)
+            entry = ledger["files"].get(name) if ledger else None
+            if not entry or entry["opened_at"] != opened_at:
+                continue
+            reclaimed["bytes"] += delete_upload(user_id, name)
+            reclaimed["files"] += 1
+    return reclaimed
+
+def delete_user_data(user_id):
+    with _ledger_lock:
+        _ledgers.pop(user_id, None)
+    retention.untrack_user(user_id)
+    forget_user(user_id)
+    state.clear_user(user_id)
+    path = os.path.join(BASE_DIR, str(user_id))
+    forget_writes(path + os.sep)
+    if os.path.exists(path):
+        shutil.rmtree(path)
 
 def is_txt_file(file_name):
     return file_name.lower().endswith(".txt")
 
-def save_upload(user_id, file_name, content: bytes):
-    user_path = get_uploaded_dir(user_id)
-    save_path = os.path.join(user_path, file_name)
-    with open(save_path, "wb") as f:
+def get_upload_path(user_id, file_name):
+    return os.path.join(get_uploaded_dir(user_id), os.path.basename(file_name))
+
+# Disk side of saving an upload, run on the I/O pool: store `src_path`
+# (compressed) as `staged`; returns (stored size, original size, lines)
+def _stage_upload(staged, src_path):
+    if UPLOAD_COMPRESS_LEVEL > 0:
+        raw_size, lines = compress_file(src_path, staged)
+    else:
+        os.replace(src_path, staged)
+        raw_size, lines = scan(staged)
+    return os.path.getsize(staged), raw_size, lines
+
+def _write_part(part, content):
+    with open(part, "wb") as f:
         f.write(content)
+
+async def save_upload(user_id, file_name, content: bytes, quota_mb=MAX_FILE_SIZE_MB):
+    part = f"{get_upload_path(user_id, file_name)}.part"
+    await run_io(_write_part, part, content)
+    return await save_upload_from_file(user_id, file_name, part, quota_mb)
+
+# Adopt a file already streamed to disk (e.g. a `.part` download) as an upload.
+# Returns None, keeping nothing, if its stored size would take the user past
+# `quota_mb` (None = no limit).
+async def save_upload_from_file(user_id, file_name, src_path, quota_mb=MAX_FILE_SIZE_MB):
+    save_path = get_upload_path(user_id, file_name)
+    staged = f"{save_path}.tmp"
+    size, raw_size, lines = await run_io(_stage_upload, staged, src_path)
+    old = get_file_info(user_id, os.path.basename(save_path))
+    total = _get_ledger(user_id)["total"] - (old["size"] if old else 0) + size
+    if quota_mb is not None and total > quota_mb * 1024 * 1024:
+        await run_io(os.remove, staged)
+        return None
+    os.replace(staged, save_path)
+    return _register_upload(user_id, save_path, size, raw_size, lines)
+
+def _register_upload(user_id, save_path, size, raw_size, lines):
+    user_path, file_name = os.path.split(save_path)
     # Save upload time
     meta_path = os.path.join(user_path, f"{file_name}.meta.json")
-    json.dump({"uploaded_at": now_str(), "viewed": False}, open(meta_path, "w"), indent=2)
+    write_json_later(meta_path, {"uploaded_at": now_str(), "viewed": False}, indent=2)
+    # Account for it in the usage ledger
+    with _ledger_lock:
+        ledger = _get_ledger(user_id)
+        old = ledger["files"].get(file_name)
+        now = time.time()
+        ledger["files"][file_name] = {
+            "size": size, "raw_size": raw_size, "lines": lines, "uploaded_at": now, "opened_at": now
+        }
+        ledger["total"] += size - (old["size"] if old else 0)
+        retention.track(user_id, file_name, now)
+        _save_ledger(user_id)
+    # Parse once in the background; Check/Clean/Separate reuse the store
+    start_store_build(save_path, user_id)
     return save_path
@@ -0,0 +1,280 @@
+import io
+import os
+import mmap
+import struct
+import asyncio
+import logging
+import shutil
+import hashlib
+from config import STORE_CHUNK_LINES, DEDUP_MODE
+from core.parser import parse_line, parse_lines
+from core.gpt_fallback import fix_lines_with_gpt
+from core.workers import run_cpu
+from core.fileio import run_io
+from core.dedup import DedupFilter, account_keys
+from core.metrics import timed, inc
+from core.compress import open_binary, stored_position
+
+logger = logging.getLogger(__name__)
+
+# Compact per-upload account store kept next to the upload as `<file>.store`.
+#
+# Layout (little endian):
+#   header  MAGIC | sha256(source) | build:u64 | count:u64 | index_offset:u64
+#   records level:i32 banned:u8 len[8]:u16 followed by the 8 utf-8 strings
+#   index   count x u64 record offsets
+#
+# The file is read through mmap, so opening a store costs nothing up front
+# and records are decoded only when accessed. Building streams the upload in
+# chunks, so memory stays flat regardless of file size. `build` is a random
+# id per build: the same upload can be rebuilt into different records (dedup
+# state, DEDUP_GLOBAL), so anything derived from a store (core.search) is
+# tied to the build rather than to the upload's hash.
+
+MAGIC = b"RZXS2\0"
+HEADER = struct.Struct(f"<{len(MAGIC)}s32sQQQ")
+RECORD = struct.Struct("<iB8H")
+OFFSET = struct.Struct("<Q")
+STR_FIELDS = ("email", "password", "uid", "server_id", "name", "rank", "country", "credits")
+
+_hash_cache = {}
+_builds = {}
+_progress = {}
+_build_stats = {}
+
+def store_path(upload_path):
+    return f"{upload_path}.store"
+
+def file_hash(path):
+    st = os.stat(path)
+    cached = _hash_cache.get(path)
+    if cached and cached[:2] == (st.st_mtime_ns, st.st_size):
+        return cached[2]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    digest = h.digest()
+    _hash_cache[path] = (st.st_mtime_ns, st.st_size, digest)
+    return digest
+
+def pack_account(acc):
+    blobs = [str(acc[k]).encode("utf-8")[:0xFFFF] for k in STR_FIELDS]
+    head = RECORD.pack(int(acc["level"]), 1 if acc["banned"] else 0, *(len(b) for b in blobs))
+    return head + b"".join(blobs)
+
+def unpack_account(buf, offset):
+    level, banned, *lens = RECORD.unpack_from(buf, offset)
+    pos = offset + RECORD.size
+    acc = {}
+    for key, n in zip(STR_FIELDS, lens):
+        acc[key] = bytes(buf[pos:pos + n]).decode("utf-8")
+        pos += n
+    acc["level"] = level
+    acc["banned"] = bool(banned)
+    return acc
+
+class StoreWriter:
+    """Writes records as they arrive; offsets spill to a side file, not memory.
+    An upload's dedup keys (DedupFilter) are committed or dropped with it."""
+
+    def __init__(self, path, digest, dedup=None):
+        self.path = path
+        self.digest = digest
+        self.build = int.from_bytes(os.urandom(8), "little")
+        self.dedup = dedup
+        self.tmp = f"{path}.{os.getpid()}.tmp"
+        self.idx_tmp = f"{self.tmp}.idx"
+        self.count = 0
+        self._f = open(self.tmp, "wb")
+        self._idx = open(self.idx_tmp, "w+b")
+        self._f.write(HEADER.pack(MAGIC, digest, self.build, 0, 0))
+
+    def add_packed(self, record):
+        self._idx.write(OFFSET.pack(self._f.tell()))
+        self._f.write(record)
+        self.count += 1
+
+    def commit(self):
+        index_offset = self._f.tell()
+        self._idx.seek(0)
+        shutil.copyfileobj(self._idx, self._f)
+        self._f.seek(0)
+        self._f.write(HEADER.pack(MAGIC, self.digest, self.build, self.count, index_offset))
+        self._f.close()
+        self._idx.close()
+        os.remove(self.idx_tmp)
+        if self.dedup:
+            self.dedup.commit()
+        os.replace(self.tmp, self.path)
+
+    def abort(self):
+        for fh, p in ((self._f, self.tmp), (self._idx, self.idx_tmp)):
+            fh.close()
+            if os.path.exists(p):
+                os.remove(p)
+        if self.dedup:
+            self.dedup.abort()
+
+class AccountStore:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.digest, self.build, self.count, self._index = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self._mm.close()
+            raise ValueError(f"Not an account store: {path}")
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        (offset,) = OFFSET.unpack_from(self._mm, self._index + i * OFFSET.size)
+        return unpack_account(self._mm, offset)
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self[i]
+
+    def close(self):
+        self._mm.close()
+
+# Open the store for an upload if it exists and matches the file's content hash
+def open_store(upload_path):
+    path = store_path(upload_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        store = AccountStore(path)
+    except (ValueError, struct.error, OSError):
+        return None
+    if store.digest != file_hash(upload_path):
+        store.close()
+        return None
+    return store
+
+# Stream an upload (decompressing if stored compressed) as lists of lines,
+# each paired with how far into the stored file reading has got
+def iter_line_chunks(path, size=STORE_CHUNK_LINES):
+    with open_binary(path) as raw:
+        f = io.TextIOWrapper(raw, encoding="utf-8", errors="replace")
+        chunk = []
+        for line in f:
+            chunk.append(line.rstrip("\r\n"))
+            if len(chunk) >= size:
+                yield chunk, stored_position(raw)
+                chunk = []
+        if chunk:
+            yield chunk, stored_position(raw)
+
+# Worker-process job: parse a chunk and pack each account. Returns one entry
+# per non-blank line: (packed record, dedup keys), or (None, raw line) if the
+# line needs GPT repair.
+def pack_lines(lines):
+    lines = [l for l in lines if l.strip()]
+    return [(pack_account(acc), account_keys(acc)) if acc else (None, line)
+            for line, acc in zip(lines, parse_lines(lines))]
+
+# Blocking (run_io): dedup-filter a packed chunk and append the records kept;
+# returns how many were skipped as duplicates
+def _write_chunk(writer, packed):
+    packed = [(rec, keys) for rec, keys in packed if rec is not None]
+    dups = writer.dedup.check([keys for _, keys in packed]) if writer.dedup else [False] * len(packed)
+    skipped = 0
+    for (rec, _), dup in zip(packed, dups):
+        if dup and DEDUP_MODE == "skip":
+            skipped += 1
+            continue
+        writer.add_packed(rec)
+    return skipped
+
+# `user_id` enables cross-upload dedup (DEDUP_MODE) against that user's index
+@timed("store_build")
+async def _build_store(upload_path, user_id=None):
+    # all disk work (hashing, reading and gunzipping, writing) is on the I/O pool
+    digest = await run_io(file_hash, upload_path)
+    total = os.path.getsize(upload_path) or 1
+    _progress[upload_path] = 0.0
+    dedup = None
+    if user_id is not None and DEDUP_MODE != "off":
+        dedup = await run_io(DedupFilter, user_id, upload_path)
+    writer = await run_io(StoreWriter, store_path(upload_path), digest, dedup)
+    chunks = iter_line_chunks(upload_path)
+    try:
+        while (item := await run_io(next, chunks, None)) is not None:
+            chunk, done = item
+            inc("bytes_processed_total", sum(len(l) + 1 for l in chunk))
+            packed = await run_cpu(pack_lines, chunk)
+            broken = [i for i, (rec, _) in enumerate(packed) if rec is None]
+            inc("parse_lines_total", len(packed) - len(broken), outcome="parsed")
+            inc("parse_lines_total", len(broken), outcome="failed")
+            if broken:
+                fixed = await fix_lines_with_gpt(packed[i][1] for i in broken)
+                for i, line in zip(broken, fixed):
+                    acc = parse_line(line) if line else None
+                    packed[i] = (pack_account(acc), account_keys(acc)) if acc else (None, None)
+            inc("duplicates_skipped_total", await run_io(_write_chunk, writer, packed))
+            _progress[upload_path] = min(done / total, 1.0)
+    except BaseException:
+        await run_io(chunks.close)
+        await run_io(writer.abort)
+        raise
+    finally:
+        _progress.pop(upload_path, None)
+    await run_io(writer.commit)
+    _build_stats[upload_path] = {
+        "accounts": writer.count,
+        "duplicates": dedup.duplicates if dedup else 0,
+    }
+
+# Stats of the last build of this upload ({"accounts", "duplicates"}), reported once
+def pop_build_stats(upload_path):
+    return _build_stats.pop(upload_path, None)
+
+# Fraction of an in-flight build that is done, or None if none is running
+def get_build_progress(upload_path):
+    return _progress.get(upload_path)
+
+# Parse the upload once; concurrent callers share the same in-flight build
+async def load_store(upload_path, user_id=None):
+    store = await run_io(open_store, upload_path)
+    if store is not None:
+        return store
+    task = _builds.get(upload_path)
+    if task is None:
+        task = asyncio.ensure_future(_build_store(upload_path, user_id))
+        _builds[upload_path] = task
+        task.add_done_callback(lambda _: _builds.pop(upload_path, None))
+    await task
+    return await run_io(open_store, upload_path)
+
+# Number of accounts in the upload (building its store if needed); for callers
+# that only need to know whether there is anything to work on
+async def count_accounts(upload_path, user_id=None):
+    store = await load_store(upload_path, user_id)
+    if store is None:
+        return 0
+    count = len(store)
+    store.close()
+    return count
+
+# Kick off the parse in the background when called from the event loop
+def start_store_build(upload_path, user_id=None):
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+    if upload_path in _builds:
+        return _builds[upload_path]
+    task = loop.create_task(load_store(upload_path, user_id))
+    task.add_done_callback(_report_build_error)
+    return task
+
+def _report_build_error(task):
+    if not task.cancelled() and task.exception():
+        logger.error("Store build error", exc_info=task.exception())
@@ -1,9 +1,13 @@
 import os
+import time
 import shutil
+import asyncio
 from datetime import datetime
 
 def readable_size(path):
-    size = os.path.getsize(path)
+    return format_size(os.path.getsize(path))
+
+def format_size(size):
     for unit in ['B', 'KB', 'MB', 'GB']:
         if size < 1024:
             return f"{size:.2f} {unit}"
@@ -17,4 +21,21 @@ def clear_folder(path):
     if os.path.exists(path):
         shutil.rmtree(path)
     os.makedirs(path)
- 
+
+class RateLimiter:
+    """Spaces request starts so no more than `per_minute` go out per minute."""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0
+        self.next_at = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self.lock:
+            now = time.monotonic()
+            delay = self.next_at - now
+            self.next_at = max(now, self.next_at) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
@@ -1,63 +1,37 @@
-import os
-import json
-from config import BASE_DIR
-from core.parser import parse_line, clean_format_block
-from core.utils import now_str
+from core.parser import parse_line, clean_format_block, build_output_line
+from core.metrics import timed
+from core.output import OutputBuffer, SPOOL_BYTES
+from core import state
 
 LABELS = ["Good", "Average", "Trash", "Incorrect", "Banned"]
 
-def get_resume_path(user_id, session_id, level):
-    resume_dir = os.path.join(BASE_DIR, str(user_id), "generated", session_id)
-    os.makedirs(resume_dir, exist_ok=True)
-    return os.path.join(resume_dir, f"resume_{level}.json")
-
-def load_resume(user_id, session_id, level):
-    path = get_resume_path(user_id, session_id, level)
-    if os.path.exists(path):
-        return json.load(open(path))
-    return {"line": 0, "checked": []}
-
-def save_resume(user_id, session_id, level, data):
-    path = get_resume_path(user_id, session_id, level)
-    json.dump(data, open(path, "w"), indent=2)
-
-def get_labels_path(folder):
-    return os.path.join(folder, "labeled_accounts.json")
-
-def load_labels(folder):
-    path = get_labels_path(folder)
-    if os.path.exists(path):
-        return json.load(open(path))
-    return {}
-
-def save_labels(folder, data):
-    json.dump(data, open(get_labels_path(folder), "w"), indent=2)
-
-def save_label(user_id, session_id, level, acc, label):
-    folder = os.path.join(BASE_DIR, str(user_id), "generated", session_id)
-    labels_path = get_labels_path(folder)
-    labels = load_labels(folder)
-
-    uid = acc["uid"]
-    old_label = labels.get(uid)
-
-    def block(a): return clean_format_block(a) + "\n\n"
-
-    # Remove from old label file
-    if old_label and old_label != label:
-        old_path = os.path.join(folder, f"{old_label}.txt")
-        if os.path.exists(old_path):
-            content = open(old_path, encoding="utf-8").read()
-            content = content.replace(block(acc), "")
-            open(old_path, "w", encoding="utf-8").write(content)
-
-    # Save to new label
-    labels[uid] = label
-    save_labels(folder, labels)
-
-    new_path = os.path.join(folder, f"{label}.txt")
-    with open(new_path, "a", encoding="utf-8") as f:
-        f.write(block(acc))
+# ─────────── Labels ───────────
+# The latest label per account lives in the shared state database
+# (core.state), so any bot process sees every decision as soon as it is made;
+# the per-label .txt files are only produced, as documents (core.output), by
+# export_labels() when the reviewer hits Extract.
+
+# Blocking: run through core.fileio.run_io
+def get_labels(user_id, session_id, uids):
+    return state.get_labels(user_id, session_id, uids)
+
+# Blocking: run through core.fileio.run_io
+@timed("save_label")
+def save_label(user_id, session_id, acc, label):
+    state.set_labels(user_id, session_id, [(acc["uid"], label, build_output_line(acc))])
+
+# Build one `<Label>.txt` document per label from the current label state.
+# Blocking: handlers run it through core.fileio.run_io.
+def export_labels(user_id, session_id):
+    outs = {}
+    for label, line in state.list_labels(user_id, session_id):
+        acc = parse_line(line)
+        if not acc:
+            continue
+        if label not in outs:
+            outs[label] = OutputBuffer(f"{label}.txt", SPOOL_BYTES // len(LABELS))
+        outs[label].write(clean_format_block(acc) + "\n\n")
+    return [outs[label].finish() for label in LABELS if label in outs]
 
 def format_account_message(acc, line_idx, total_lines, label=None, checked=False):
     sorted_text = f"🏷️ Sorted: {label if label else 'Not Yet Sorted'}"
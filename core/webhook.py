@@ -0,0 +1,151 @@
+import os
+import json
+import signal
+import asyncio
+import multiprocessing
+from telegram import Bot, Update
+from config import (
+    BOT_TOKEN, WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_SECRET, WEBHOOK_WORKERS
+)
+
+# Webhook deployment across several processes.
+#
+# The front process registers WEBHOOK_URL with Telegram and accepts its POSTs
+# on WEBHOOK_LISTEN:WEBHOOK_PORT. Each update is routed by the user (or chat)
+# it comes from to worker `id % WEBHOOK_WORKERS`, a separate process running a
+# full Application fed through a queue, so one user's updates are always
+# handled in order by the same process while different users spread over all
+# cores. Everything the workers share lives in core.state; a worker that dies
+# is restarted on the same queue.
+
+SECRET_HEADER = b"x-telegram-bot-api-secret-token"
+MAX_BODY = 1 << 20
+
+def _affinity_id(update):
+    for key, value in update.items():
+        if key == "update_id" or not isinstance(value, dict):
+            continue
+        for holder in (value, value.get("message") or {}):
+            for field in ("from", "user", "chat"):
+                if isinstance(holder.get(field), dict) and "id" in holder[field]:
+                    return abs(int(holder[field]["id"]))
+    return 0
+
+# ─────────── Workers ───────────
+def _worker_main(factory, index, count, queue):
+    from core.state import set_worker
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the front decides when to stop
+    set_worker(index, count)
+    asyncio.run(_run_worker(factory, queue))
+
+async def _run_worker(factory, queue):
+    app = factory(updater=False)
+    await app.initialize()
+    if app.post_init:
+        await app.post_init(app)
+    await app.start()
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            body = await loop.run_in_executor(None, queue.get)
+            if body is None:
+                break
+            await app.update_queue.put(Update.de_json(json.loads(body), app.bot))
+    finally:
+        await app.stop()
+        if app.post_stop:
+            await app.post_stop(app)
+        await app.shutdown()
+        if app.post_shutdown:
+            await app.post_shutdown(app)
+
+# ─────────── Front ───────────
+class Front:
+    def __init__(self, factory, count):
+        self.factory = factory
+        self.count = count
+        self.ctx = multiprocessing.get_context("spawn")
+        self.queues = [self.ctx.Queue() for _ in range(count)]
+        self.workers = [None] * count
+        self.path = "/" + WEBHOOK_URL.split("://", 1)[-1].partition("/")[2]
+
+    def spawn(self, index):
+        proc = self.ctx.Process(
+            target=_worker_main, args=(self.factory, index, self.count, self.queues[index]),
+            name=f"bot-worker-{index}"  # not daemonic: workers start their own CPU pools
+        )
+        proc.start()
+        self.workers[index] = proc
+
+    async def supervise(self):
+        while True:
+            await asyncio.sleep(5)
+            for i, proc in enumerate(self.workers):
+                if not proc.is_alive():
+                    print(f"Worker {i} exited ({proc.exitcode}), restarting")
+                    self.spawn(i)
+
+    async def handle(self, reader, writer):
+        status = "200 OK"
+        try:
+            request = (await reader.readline()).split()
+            headers = {}
+            while (line := await reader.readline()).strip():
+                name, _, value = line.partition(b":")
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get(b"content-length", 0))
+            if request[:2] != [b"POST", self.path.encode()] or length > MAX_BODY:
+                status = "404 Not Found"
+            elif headers.get(SECRET_HEADER) != WEBHOOK_SECRET.encode():
+                status = "403 Forbidden"
+            else:
+                body = await reader.readexactly(length)
+                update = json.loads(body)
+                if not isinstance(update, dict):
+                    raise ValueError("update is not an object")
+                self.queues[_affinity_id(update) % self.count].put(body)
+        except (ValueError, TypeError, IndexError, asyncio.IncompleteReadError):
+            status = "400 Bad Request"
+        try:
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Length: 0\r\nConnection: close\r\n\r\n".encode())
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def run(self):
+        for i in range(self.count):
+            self.spawn(i)
+        async with Bot(BOT_TOKEN) as bot:
+            await bot.set_webhook(WEBHOOK_URL, secret_token=WEBHOOK_SECRET,
+                                  allowed_updates=Update.ALL_TYPES)
+        server = await asyncio.start_server(self.handle, WEBHOOK_LISTEN, WEBHOOK_PORT)
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        supervisor = loop.create_task(self.supervise())
+        print(f"Webhook listening on {WEBHOOK_LISTEN}:{WEBHOOK_PORT}{self.path} "
+              f"with {self.count} workers")
+        await stop.wait()
+        supervisor.cancel()
+        server.close()
+        for q in self.queues:
+            q.put(None)
+        for proc in self.workers:
+            proc.join(timeout=30)
+            if proc.is_alive():
+                print(f"{proc.name} did not stop, terminating")
+                proc.terminate()
+                proc.join()
+
+# `factory(updater=False)` must return a fully wired Application (bot.build_application)
+def run_webhook(factory, workers=WEBHOOK_WORKERS):
+    # without the secret anyone reaching the port could post updates as an admin
+    if not WEBHOOK_SECRET:
+        raise SystemExit("WEBHOOK_SECRET must be set to run in webhook mode")
+    workers = max(1, workers)
+    # each worker has its own CPU pool; share the cores between them
+    os.environ.setdefault("WORKER_PROCESSES", str(max(1, (os.cpu_count() or 2) // workers)))
+    asyncio.run(Front(factory, workers).run())
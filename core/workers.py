@@ -0,0 +1,29 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from config import WORKER_PROCESSES
+from core.metrics import timed
+
+# Process pool for CPU-heavy bulk work (parsing chunks, formatting outputs).
+# Handlers await run_cpu(...) so the event loop keeps serving other users
+# while large files are processed on other cores. Job functions must be
+# top-level and take/return picklable values.
+
+_pool = None
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=WORKER_PROCESSES)
+    return _pool
+
+async def run_cpu(fn, *args):
+    return await timed("worker_job", job=fn.__name__)(_submit)(fn, *args)
+
+async def _submit(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(get_pool(), fn, *args)
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+# config reads these at import time, so point them at a scratch tree first
+os.environ["BASE_DIR"] = tempfile.mkdtemp(prefix="rzx-test-")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,43 @@
+import os
+import asyncio
+import pytest
+from core import dedup, store, storage
+from core.parser import build_output_line
+from core.workers import shutdown_pool
+
+def _lines(start, stop):
+    return "".join(build_output_line({
+        "email": f"user{i}@example.com", "password": "pw", "uid": str(1000 + i),
+        "server_id": "1", "name": f"n{i}", "rank": "Gold", "level": i % 120,
+        "country": "US", "banned": False, "credits": "c",
+    }) + "\n" for i in range(start, stop)).encode("utf-8")
+
+@pytest.fixture(autouse=True)
+def _pool():
+    yield
+    shutdown_pool()
+
+async def _count(path, user_id):
+    s = await store.load_store(path, user_id)
+    try:
+        return len(s)
+    finally:
+        s.close()
+
+@pytest.mark.skipif(store.DEDUP_MODE != "skip", reason="needs DEDUP_MODE=skip")
+@pytest.mark.parametrize("fresh_index", [False, True])
+def test_rebuild_after_overlap_keeps_accounts(fresh_index):
+    user_id = 101 + fresh_index
+
+    async def main():
+        a = await storage.save_upload(user_id, "a.txt", _lines(0, 30), None)
+        assert await _count(a, user_id) == 30
+        # b repeats all of a: only its 20 new accounts are stored
+        b = await storage.save_upload(user_id, "b.txt", _lines(0, 50), None)
+        assert await _count(b, user_id) == 20
+        if fresh_index:  # as after a restart: keys come from the .keys files
+            dedup._indexes.clear()
+        os.remove(store.store_path(a))
+        assert await _count(a, user_id) == 30
+
+    asyncio.run(main())